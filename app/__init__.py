@@ -1,3 +1,4 @@
+import logging
 from flask import Flask
 from flask_cors import CORS
 from config import config
@@ -7,6 +8,15 @@ def create_app(config_name='development'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
+    # Logging; debug messages are skipped cheaply unless LOG_LEVEL=DEBUG
+    logging.basicConfig(level=app.config['LOG_LEVEL'], format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    logging.getLogger().setLevel(app.config['LOG_LEVEL'])
+    
+    # Client address and scheme as reported by trusted reverse proxies
+    if app.config['PROXY_FIX_X_FOR'] or app.config['PROXY_FIX_X_PROTO']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'], x_proto=app.config['PROXY_FIX_X_PROTO'])
+    
     # CORS Configuration
     CORS(app, 
          resources={r"/api/*": {"origins": "*"}},
@@ -18,6 +28,18 @@ def create_app(config_name='development'):
     from app.middleware.auth import init_auth
     init_auth(app)
     
+    # Request metrics (/api/metrics)
+    from app.middleware.metrics import init_metrics
+    init_metrics(app)
+    
+    # Rate limits and load shedding
+    from app.middleware.ratelimit import init_rate_limits
+    init_rate_limits(app)
+    
+    # gzip/brotli for JSON responses
+    from app.middleware.compression import init_compression
+    init_compression(app)
+    
     # Register database teardown
     from app.db.db import close_db
     app.teardown_appcontext(close_db)
@@ -32,9 +54,27 @@ def create_app(config_name='development'):
     def unauthorized(error):
         from flask import jsonify
         return jsonify({"error": "Unauthorized"}), 401
+
+    from app.db.writer import WriteQueueFull
+
+    @app.errorhandler(WriteQueueFull)
+    def write_queue_full(error):
+        from flask import jsonify
+        response = jsonify({"error": str(error)})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    @app.errorhandler(413)
+    def too_large(error):
+        from flask import jsonify
+        return jsonify({"error": "Request body too large", "max_bytes": app.config['MAX_CONTENT_LENGTH']}), 413
     
     # Register blueprints
     from app.routes import register_routes
     register_routes(app)
     
+    # Maintenance commands (flask migrate-blobs, ...)
+    from app.cli import register_commands
+    register_commands(app)
+    
     return app
\ No newline at end of file
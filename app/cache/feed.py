@@ -0,0 +1,77 @@
+import threading
+from flask import current_app
+from app.cache.lru import LRUCache
+from app.utils.compression import compress_body
+
+class FeedCache:
+    """Rendered feed pages, tagged with the data version and post ids they were built from.
+
+    Writes made by this process invalidate exactly the pages they affect
+    (note_write). Writes made by other processes show up as a data version
+    this cache hasn't seen, which drops every page.
+    """
+
+    def __init__(self, maxsize, ttl, max_entry_bytes):
+        self.max_entry_bytes = max_entry_bytes
+        self.version = None
+        self._pages = LRUCache(maxsize, ttl=ttl, name="feed_pages")
+        self._lock = threading.Lock()
+
+    def get(self, key, version, encoding=None):
+        """Cached (body, content encoding) for key, or None; `version` is the data version just read from the database.
+
+        With an encoding, pages of at least COMPRESS_MIN_SIZE bytes come back
+        compressed; each page is compressed once per encoding and kept with it.
+        """
+        with self._lock:
+            if version != self.version:
+                self._pages.clear()
+                self.version = version
+
+        page = self._pages.get(key)
+        if page is None:
+            return None
+        if encoding is None or len(page["body"]) < current_app.config['COMPRESS_MIN_SIZE']:
+            return page["body"], None
+
+        encoded = page["encoded"].get(encoding)
+        if encoded is None:
+            encoded = page["encoded"][encoding] = compress_body(page["body"], encoding)
+        return encoded, encoding
+
+    def put(self, key, version, body, post_ids, first_page):
+        with self._lock:
+            # a write landed while this page was being built
+            if version != self.version or len(body) > self.max_entry_bytes:
+                return
+            self._pages.set(key, {"body": body, "encoded": {}, "post_ids": frozenset(post_ids), "first_page": first_page})
+
+    def note_write(self, version, post_ids=(), new_post=False, everything=False):
+        """Invalidate pages after this process committed a write that produced `version`"""
+        post_ids = set(post_ids)
+        with self._lock:
+            if everything or self.version is None or version > self.version + 1:
+                # other processes wrote in between; we can't know what changed
+                self._pages.clear()
+            else:
+                for key, page in self._pages.items():
+                    # new posts only ever land on first pages; keyset cursors further on are unaffected
+                    if (new_post and page["first_page"]) or page["post_ids"] & post_ids:
+                        self._pages.pop(key)
+
+            if self.version is None or version > self.version:
+                self.version = version
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self.version = None
+
+feed_cache = None
+
+def get_feed_cache():
+    global feed_cache
+    if feed_cache is None:
+        config = current_app.config
+        feed_cache = FeedCache(config['FEED_CACHE_SIZE'], config['FEED_CACHE_TTL'], config['FEED_CACHE_MAX_ENTRY_BYTES'])
+    return feed_cache
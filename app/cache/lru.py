@@ -0,0 +1,64 @@
+import threading
+import time
+from collections import OrderedDict
+from app.metrics.registry import CACHE_REQUESTS
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU cache with optional per-entry expiry"""
+
+    def __init__(self, maxsize, ttl=None, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        if name:
+            self._hits = CACHE_REQUESTS.labels(name, "hit")
+            self._misses = CACHE_REQUESTS.labels(name, "miss")
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is not None and expires_at <= time.time():
+                    del self._data[key]
+                    entry = None
+                else:
+                    self._data.move_to_end(key)
+
+        if self.name:
+            (self._misses if entry is None else self._hits).inc()
+        return default if entry is None else value
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        """Store a value; it expires at `expires_at` (epoch seconds), after `ttl` seconds, or after the cache default ttl"""
+        ttl = ttl if ttl is not None else self.ttl
+        if ttl is not None:
+            ttl_expiry = time.time() + ttl
+            expires_at = ttl_expiry if expires_at is None else min(expires_at, ttl_expiry)
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def items(self):
+        """Snapshot of the unexpired (key, value) pairs"""
+        now = time.time()
+        with self._lock:
+            return [(k, v) for k, (v, expires_at) in self._data.items() if expires_at is None or expires_at > now]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
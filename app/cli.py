@@ -0,0 +1,95 @@
+import base64
+import binascii
+import click
+from app.db.db import get_db, get_pool, transaction
+from app.storage.blobs import put_blob
+from app.models.search import rebuild_search_index
+from app.models.derivative import get_images_needing_derivatives, mark_pending
+from app.storage.derivatives import DERIVATIVE_SIZES, record_render, submit_render
+from app.utils.images import PILLOW_AVAILABLE
+
+def register_commands(app):
+    """Register maintenance commands on the flask CLI"""
+
+    @app.cli.command('migrate-blobs')
+    @click.option('--batch-size', default=100, show_default=True, help='Rows moved per transaction')
+    @click.option('--vacuum/--no-vacuum', default=True, show_default=True, help='Reclaim database space afterwards')
+    def migrate_blobs(batch_size, vacuum):
+        """Move base64 images out of the images table into the blob store"""
+        db = get_db()
+        moved = 0
+        last_id = 0
+
+        while True:
+            rows = db.execute(
+                "SELECT id, base64_image FROM images WHERE base64_image IS NOT NULL AND image_hash IS NULL AND id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+
+            with transaction() as write_db:
+                for row in rows:
+                    try:
+                        image_bytes = base64.b64decode(row["base64_image"])
+                    except binascii.Error:
+                        click.echo(f'Skipping image {row["id"]}: stored data is not valid base64', err=True)
+                        continue
+
+                    image_hash, image_size = put_blob(image_bytes)
+                    write_db.execute(
+                        "UPDATE images SET image_hash = ?, image_size = ?, base64_image = NULL WHERE id = ?",
+                        (image_hash, image_size, row["id"])
+                    )
+                    moved += 1
+
+            click.echo(f'Moved {moved} images')
+
+        if vacuum and moved:
+            with get_pool().write_lock:
+                get_pool().writer().execute("VACUUM")
+
+        click.echo(f'Done, {moved} images moved to the blob store')
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search():
+        """Re-index every post for /api/search"""
+        count = rebuild_search_index()
+        click.echo(f'Indexed {count} posts')
+
+    @app.cli.command('generate-derivatives')
+    @click.option('--batch-size', default=50, show_default=True, help='Images rendered at a time')
+    @click.option('--size', 'sizes', multiple=True, type=click.Choice(sorted(DERIVATIVE_SIZES)), help='Only these sizes (default: all)')
+    @click.option('--force', is_flag=True, help='Re-render derivatives that are already ready')
+    def generate_derivatives(batch_size, sizes, force):
+        """Render missing, failed or stalled thumbnails for stored images"""
+        if not PILLOW_AVAILABLE:
+            raise click.ClickException('Pillow is not installed')
+
+        sizes = list(sizes or DERIVATIVE_SIZES)
+        rendered = failed = 0
+        last_hash = ''
+
+        while True:
+            source_hashes = get_images_needing_derivatives(sizes, last_hash, batch_size, force)
+            if not source_hashes:
+                break
+            last_hash = source_hashes[-1]
+
+            with transaction() as write_db:
+                pending = {source_hash: mark_pending(write_db, source_hash, sizes, force) for source_hash in source_hashes}
+
+            # renders are content-addressed, so running this next to the web
+            # workers' own renders only repeats work, never conflicts
+            futures = [(source_hash, todo, submit_render(source_hash, todo)) for source_hash, todo in pending.items() if todo]
+            for source_hash, todo, future in futures:
+                record_render(source_hash, todo, future)
+                if future.exception() is None:
+                    rendered += 1
+                else:
+                    failed += 1
+
+            click.echo(f'Rendered {rendered} images, {failed} failed')
+
+        click.echo(f'Done, {rendered} images rendered, {failed} failed')
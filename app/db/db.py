@@ -1,53 +1,216 @@
+import os
+import queue
 import sqlite3
-from flask import g
+import threading
+from contextlib import contextmanager
+from flask import g, current_app
+from app.db.migrations import migrate
+from app.db.instrumented import InstrumentedConnection
+from app.db.writer import GroupCommitWriter
+
+class ConnectionPool:
+    """Per-process SQLite connections: a bounded set of readers and one writer.
+
+    With WAL enabled readers never wait for the writer, so feed reads keep
+    going while an upload commits. Writes go through transaction(), which
+    serializes them on the single writer connection.
+    """
+
+    def __init__(self, path, size, timeout, pragmas, factory=sqlite3.Connection):
+        self.path = path
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = pragmas
+        self.pid = os.getpid()
+        self.write_lock = threading.RLock()
+        self._readers = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._writer = None
+        self._group_writer = None
+
+    def connect(self, **kwargs):
+        conn = sqlite3.connect(self.path, check_same_thread=False, factory=self.factory, **kwargs)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire(self):
+        """Borrow a read connection, opening a new one while under the pool size"""
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                conn = self.connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+            conn.execute("PRAGMA query_only = ON")
+            return conn
+
+        try:
+            return self._readers.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError("Timed out waiting for a database connection")
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._readers.put(conn)
+
+    def writer(self):
+        """The process's write connection; callers must hold write_lock"""
+        if self._writer is None:
+            # autocommit mode: transaction() issues BEGIN IMMEDIATE / COMMIT itself
+            self._writer = self.connect(isolation_level=None)
+            self._writer.execute("PRAGMA journal_mode = WAL")
+        return self._writer
+
+    def group_writer(self, max_batch, max_latency, queue_size, enqueue_timeout):
+        """The process's group-commit writer thread, started on first use"""
+        with self._lock:
+            if self._group_writer is None:
+                self._group_writer = GroupCommitWriter(self, max_batch, max_latency, queue_size, enqueue_timeout)
+            return self._group_writer
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# pools inherited across a fork; kept referenced so their connections are never
+# closed (and the parent's WAL never checkpointed) from the child
+_abandoned = []
+
+def get_pool(app=None):
+    """Connection pool for the configured database in this process"""
+    app = app or current_app
+    path = app.config['DATABASE_PATH']
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is not None and pool.pid != os.getpid():
+            _abandoned.append(pool)
+            pool = None
+
+        if pool is None:
+            pool = ConnectionPool(
+                path,
+                size=app.config['SQLITE_READ_POOL_SIZE'],
+                timeout=app.config['SQLITE_POOL_TIMEOUT'],
+                pragmas=[
+                    ("synchronous", "NORMAL"),
+                    ("busy_timeout", int(app.config['SQLITE_BUSY_TIMEOUT_MS'])),
+                    ("mmap_size", int(app.config['SQLITE_MMAP_SIZE'])),
+                    # negative cache_size is in KiB rather than pages
+                    ("cache_size", -int(app.config['SQLITE_CACHE_SIZE_KB'])),
+                    ("temp_store", "MEMORY"),
+                    ("foreign_keys", "ON"),
+                ],
+                factory=InstrumentedConnection if app.config['METRICS_ENABLED'] else sqlite3.Connection
+            )
+            _pools[path] = pool
+        return pool
+
+def close_pools():
+    """Close this process's connections, e.g. in a prefork master before its workers start"""
+    with _pools_lock:
+        pools = [pool for pool in _pools.values() if pool.pid == os.getpid()]
+        for pool in pools:
+            del _pools[pool.path]
+
+    for pool in pools:
+        with pool.write_lock:
+            if pool._writer is not None:
+                pool._writer.close()
+                pool._writer = None
+        while True:
+            try:
+                pool._readers.get_nowait().close()
+            except queue.Empty:
+                break
 
 def get_db():
-    """Get database connection"""
+    """Get a read connection for this request"""
     if 'db' not in g:
-        g.db = sqlite3.connect("database.db")
-        g.db.row_factory = sqlite3.Row
+        g.db_pool = get_pool()
+        g.db = g.db_pool.acquire()
     return g.db
 
+@contextmanager
+def transaction():
+    """Run a block of writes in one transaction on the process's writer connection"""
+    pool = get_pool()
+    with pool.write_lock:
+        db = pool.writer()
+
+        # nested use joins the transaction that is already open
+        if db.in_transaction:
+            yield db
+            return
+
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+def run_write(write, after_commit=None):
+    """Run write(db) on the writer connection, commit, and return its result.
+
+    With WRITE_QUEUE_ENABLED the write is queued for the process's group-commit
+    writer, which merges concurrent writes into one transaction; this call
+    still returns only once the write is committed. after_commit(result) runs
+    right after the commit, in commit order. Neither write nor after_commit may
+    need an app context: with the queue they run on the writer thread.
+    """
+    config = current_app.config
+    if not config['WRITE_QUEUE_ENABLED']:
+        with transaction() as db:
+            result = write(db)
+        if after_commit is not None:
+            after_commit(result)
+        return result
+
+    writer = get_pool().group_writer(
+        config['WRITE_QUEUE_MAX_BATCH'],
+        config['WRITE_QUEUE_MAX_LATENCY_MS'] / 1000.0,
+        config['WRITE_QUEUE_SIZE'],
+        config['WRITE_QUEUE_TIMEOUT']
+    )
+    return writer.submit(write, after_commit).result()
+
+def get_data_version(db=None):
+    """Current data version; changes whenever posts, comments or usernames change"""
+    db = db or get_db()
+    return db.execute("SELECT version FROM data_version WHERE id = 1").fetchone()[0]
+
+def bump_data_version(db):
+    """Increment the data version inside a write transaction and return the new value"""
+    return db.execute("UPDATE data_version SET version = version + 1 WHERE id = 1 RETURNING version").fetchone()[0]
+
 def close_db(e=None):
-    """Close database connection"""
+    """Return the request's read connection to the pool"""
     db = g.pop('db', None)
+    pool = g.pop('db_pool', None)
     if db is not None:
-        db.close()
+        pool.release(db)
 
 def init_db():
-    """Initialize database tables"""
-    db = get_db()
-    
-    db.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY, 
-            username TEXT UNIQUE,
-            auth0_sub TEXT UNIQUE
-        )
-    """)
-    
-    db.execute("""
-        CREATE TABLE IF NOT EXISTS images (
-            id INTEGER PRIMARY KEY, 
-            user_id INTEGER, 
-            name TEXT, 
-            description TEXT, 
-            base64_image TEXT, 
-            mime_type TEXT,
-            uploaded_at INTEGER, 
-            updated_at INTEGER
-        )
-    """)
-    
-    db.execute("""
-        CREATE TABLE IF NOT EXISTS comments (
-            id INTEGER PRIMARY KEY, 
-            image_id INTEGER, 
-            user_id INTEGER, 
-            comment_text TEXT, 
-            created_at INTEGER,
-            FOREIGN KEY(image_id) REFERENCES images(id)
-        )
-    """)
-    
-    db.commit()
\ No newline at end of file
+    """Bring the database schema up to date"""
+    pool = get_pool()
+    with pool.write_lock:
+        return migrate(pool.writer())
@@ -0,0 +1,79 @@
+import re
+import sqlite3
+import time
+from functools import lru_cache
+from app.metrics.registry import Counter, Histogram
+
+QUERY_SECONDS = Histogram("db_query_seconds", "Time spent executing SQL statements", ["statement"])
+ROWS_RETURNED = Counter("db_rows_returned_total", "Rows fetched from SQL statements", ["statement"])
+
+STATEMENT_PATTERN = re.compile(
+    r"^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|PRAGMA|BEGIN|COMMIT|ROLLBACK|CREATE|DROP|ALTER|VACUUM|EXPLAIN)\b"
+    r"(?:.*?\b(?:FROM|INTO|UPDATE|TABLE|INDEX|TRIGGER)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?([\w\"]+))?",
+    re.IGNORECASE | re.DOTALL
+)
+
+@lru_cache(maxsize=1024)
+def statement_label(sql):
+    """Low-cardinality label for a statement: its verb and first table, e.g. "select images" """
+    match = STATEMENT_PATTERN.match(sql)
+    if not match:
+        return "other"
+    verb, table = match.groups()
+    if verb.upper() == "UPDATE":
+        table = re.match(r"\s*UPDATE\s+([\w\"]+)", sql, re.IGNORECASE).group(1)
+    return f"{verb.lower()} {table.strip(chr(34)).lower()}" if table else verb.lower()
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that records statement time and rows fetched"""
+
+    statement = "other"
+
+    def execute(self, sql, parameters=()):
+        self.statement = statement_label(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            QUERY_SECONDS.labels(self.statement).observe(time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.statement = statement_label(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            QUERY_SECONDS.labels(self.statement).observe(time.perf_counter() - started)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            ROWS_RETURNED.labels(self.statement).inc()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        ROWS_RETURNED.labels(self.statement).inc(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        ROWS_RETURNED.labels(self.statement).inc(len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        ROWS_RETURNED.labels(self.statement).inc()
+        return row
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose statements all run through InstrumentedCursor"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
@@ -0,0 +1,291 @@
+import logging
+
+# Versioned schema migrations.
+#
+# PRAGMA user_version records the last migration applied to a database file.
+# migrate() applies every newer entry of MIGRATIONS in order, each in its own
+# transaction, so existing databases and fresh ones end up with the same schema.
+# Never edit a migration that has shipped; append a new one instead.
+
+def create_base_schema(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            username TEXT UNIQUE,
+            auth0_sub TEXT UNIQUE
+        )
+    """)
+
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS images (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            name TEXT,
+            description TEXT,
+            base64_image TEXT,
+            image_hash TEXT,
+            image_size INTEGER,
+            mime_type TEXT,
+            uploaded_at INTEGER,
+            updated_at INTEGER
+        )
+    """)
+
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS comments (
+            id INTEGER PRIMARY KEY,
+            image_id INTEGER,
+            user_id INTEGER,
+            comment_text TEXT,
+            created_at INTEGER,
+            FOREIGN KEY(image_id) REFERENCES images(id)
+        )
+    """)
+
+    # databases created before the blob store was introduced
+    ensure_column(db, "images", "image_hash", "TEXT")
+    ensure_column(db, "images", "image_size", "INTEGER")
+
+def add_cascading_foreign_keys(db):
+    # SQLite can't alter constraints, so rebuild both tables. Rows pointing at
+    # users or posts that no longer exist are dropped on the way.
+    db.execute("""
+        CREATE TABLE images_new (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            name TEXT,
+            description TEXT,
+            base64_image TEXT,
+            image_hash TEXT,
+            image_size INTEGER,
+            mime_type TEXT,
+            uploaded_at INTEGER,
+            updated_at INTEGER
+        )
+    """)
+    db.execute("""
+        INSERT INTO images_new (id, user_id, name, description, base64_image, image_hash, image_size, mime_type, uploaded_at, updated_at)
+        SELECT id, user_id, name, description, base64_image, image_hash, image_size, mime_type, uploaded_at, updated_at
+        FROM images WHERE user_id IN (SELECT id FROM users)
+    """)
+
+    db.execute("""
+        CREATE TABLE comments_new (
+            id INTEGER PRIMARY KEY,
+            image_id INTEGER REFERENCES images(id) ON DELETE CASCADE,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            comment_text TEXT,
+            created_at INTEGER
+        )
+    """)
+    db.execute("""
+        INSERT INTO comments_new (id, image_id, user_id, comment_text, created_at)
+        SELECT id, image_id, user_id, comment_text, created_at
+        FROM comments
+        WHERE image_id IN (SELECT id FROM images_new) AND user_id IN (SELECT id FROM users)
+    """)
+
+    db.execute("DROP TABLE comments")
+    db.execute("DROP TABLE images")
+    db.execute("ALTER TABLE images_new RENAME TO images")
+    db.execute("ALTER TABLE comments_new RENAME TO comments")
+
+    violations = db.execute("PRAGMA foreign_key_check").fetchall()
+    if violations:
+        raise RuntimeError(f"{len(violations)} foreign key violations after rebuilding images and comments")
+
+def add_query_indexes(db):
+    # feed pages: ORDER BY uploaded_at DESC, id DESC with a keyset cursor
+    db.execute("CREATE INDEX IF NOT EXISTS idx_images_feed ON images(uploaded_at DESC, id DESC)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_images_user ON images(user_id)")
+    # blob reference counting when an image is replaced or deleted
+    db.execute("CREATE INDEX IF NOT EXISTS idx_images_hash ON images(image_hash)")
+    # comments of a post, oldest first, for the feed and comment pagination
+    db.execute("CREATE INDEX IF NOT EXISTS idx_comments_image ON comments(image_id, created_at, id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_comments_user ON comments(user_id)")
+
+# full-text search: one row per post with its description and author's
+# username (rowid is images.id), and one row per comment (rowid is
+# comments.id) carrying its post's id, so adding a comment indexes just that
+# comment rather than re-tokenizing its whole thread
+POST_SEARCH_SQL = """
+    INSERT INTO post_search (rowid, description, username)
+    SELECT i.id, i.description, u.username
+    FROM images i
+    LEFT JOIN users u ON i.user_id = u.id
+"""
+
+COMMENT_SEARCH_SQL = """
+    INSERT INTO comment_search (rowid, comment_text, post_id)
+    SELECT c.id, c.comment_text, c.image_id
+    FROM comments c
+"""
+
+def populate_search_index(db):
+    """Rebuild the search index from the source tables"""
+    db.execute("DELETE FROM post_search")
+    db.execute("DELETE FROM comment_search")
+    db.execute(POST_SEARCH_SQL)
+    db.execute(COMMENT_SEARCH_SQL)
+
+def add_search_index(db):
+    db.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS post_search
+        USING fts5(description, username, tokenize = 'unicode61 remove_diacritics 2')
+    """)
+    db.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS comment_search
+        USING fts5(comment_text, post_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')
+    """)
+
+    # keep the index in sync with every write path, including ones outside the
+    # models; deleting a post deletes its comments, which fires their trigger
+    triggers = {
+        "search_images_insert": ("AFTER INSERT ON images", f"{POST_SEARCH_SQL} WHERE i.id = new.id;"),
+        "search_images_update": ("AFTER UPDATE OF description, user_id ON images", f"""
+            DELETE FROM post_search WHERE rowid = new.id;
+            {POST_SEARCH_SQL} WHERE i.id = new.id;
+        """),
+        "search_images_delete": ("AFTER DELETE ON images", "DELETE FROM post_search WHERE rowid = old.id;"),
+        "search_comments_insert": ("AFTER INSERT ON comments", f"{COMMENT_SEARCH_SQL} WHERE c.id = new.id;"),
+        "search_comments_update": ("AFTER UPDATE OF comment_text, image_id ON comments", f"""
+            DELETE FROM comment_search WHERE rowid = old.id;
+            {COMMENT_SEARCH_SQL} WHERE c.id = new.id;
+        """),
+        "search_comments_delete": ("AFTER DELETE ON comments", "DELETE FROM comment_search WHERE rowid = old.id;"),
+        "search_users_update": ("AFTER UPDATE OF username ON users", f"""
+            DELETE FROM post_search WHERE rowid IN (SELECT id FROM images WHERE user_id = new.id);
+            {POST_SEARCH_SQL} WHERE i.user_id = new.id;
+        """),
+    }
+    for name, (event, body) in triggers.items():
+        db.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+
+    populate_search_index(db)
+
+def add_data_version(db):
+    # bumped in the same transaction as every write the feed depends on, so any
+    # process can tell whether its cached pages are still current
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    db.execute("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)")
+
+def add_post_events(db):
+    # append-only log of post and comment changes that /posts/stream tails;
+    # AUTOINCREMENT so ids are never reused once old events are pruned, which
+    # keeps Last-Event-ID meaningful
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS post_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event TEXT NOT NULL,
+            data TEXT NOT NULL,
+            created_at INTEGER NOT NULL
+        )
+    """)
+
+def add_change_tracking(db):
+    # change_version is the data version of the write that last touched a row,
+    # so /posts/changes can return exactly what changed after a client's token
+    ensure_column(db, "images", "change_version", "INTEGER NOT NULL DEFAULT 0")
+    ensure_column(db, "comments", "change_version", "INTEGER NOT NULL DEFAULT 0")
+    db.execute("UPDATE images SET updated_at = uploaded_at WHERE updated_at IS NULL")
+
+    # one tombstone per deleted post; its comments go with it
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS deleted_posts (
+            post_id INTEGER PRIMARY KEY,
+            change_version INTEGER NOT NULL,
+            deleted_at INTEGER NOT NULL
+        )
+    """)
+
+    db.execute("CREATE INDEX IF NOT EXISTS idx_images_change ON images(change_version)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_comments_change ON comments(change_version)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_deleted_posts_change ON deleted_posts(change_version)")
+
+def add_image_derivatives(db):
+    # resized copies of each stored image, keyed by the original's content hash
+    # so identical uploads share them; blob_hash points into the blob store
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS image_derivatives (
+            source_hash TEXT NOT NULL,
+            size TEXT NOT NULL,
+            status TEXT NOT NULL,
+            blob_hash TEXT,
+            byte_size INTEGER,
+            width INTEGER,
+            height INTEGER,
+            error TEXT,
+            updated_at INTEGER NOT NULL,
+            PRIMARY KEY (source_hash, size)
+        )
+    """)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_image_derivatives_blob ON image_derivatives(blob_hash)")
+
+def add_comment_counts(db):
+    # kept up to date by insert_comment so the feed never counts a thread;
+    # deleting a post deletes its comments with it
+    ensure_column(db, "images", "comment_count", "INTEGER NOT NULL DEFAULT 0")
+    db.execute("UPDATE images SET comment_count = (SELECT COUNT(*) FROM comments WHERE comments.image_id = images.id)")
+
+MIGRATIONS = [
+    (1, create_base_schema),
+    (2, add_cascading_foreign_keys),
+    (3, add_query_indexes),
+    (4, add_search_index),
+    (5, add_data_version),
+    (6, add_post_events),
+    (7, add_change_tracking),
+    (8, add_image_derivatives),
+    (9, add_comment_counts),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+logger = logging.getLogger(__name__)
+
+def ensure_column(db, table, column, column_type):
+    """Add a column to an existing table if it is missing"""
+    columns = [row["name"] for row in db.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+def get_schema_version(db):
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(db):
+    """Apply pending migrations on an autocommit connection, returning the resulting schema version"""
+    version = get_schema_version(db)
+    if version >= LATEST_VERSION:
+        return version
+
+    # table rebuilds need foreign key enforcement off; it can't change inside a transaction
+    db.execute("PRAGMA foreign_keys = OFF")
+    try:
+        for target, apply in MIGRATIONS:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                # re-read under the write lock in case another process migrated first
+                version = get_schema_version(db)
+                if target <= version:
+                    db.execute("ROLLBACK")
+                    continue
+
+                apply(db)
+
+                db.execute(f"PRAGMA user_version = {target}")
+                db.execute("COMMIT")
+                version = target
+                logger.info('Applied schema migration %s (%s)', target, apply.__name__)
+            except BaseException:
+                if db.in_transaction:
+                    db.execute("ROLLBACK")
+                raise
+    finally:
+        db.execute("PRAGMA foreign_keys = ON")
+
+    return version
@@ -0,0 +1,114 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from app.metrics.registry import Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH_SIZE = Histogram("db_write_batch_size", "Writes merged into each group commit", buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+WRITE_QUEUE_DEPTH = Gauge("db_write_queue_depth", "Writes waiting for the group-commit writer")
+
+class WriteQueueFull(RuntimeError):
+    """The write queue stayed full for longer than the enqueue timeout"""
+
+class PendingWrite:
+    def __init__(self, write, after_commit):
+        self.write = write
+        self.after_commit = after_commit
+        self.future = Future()
+
+class GroupCommitWriter:
+    """Single writer thread that merges queued writes into one transaction.
+
+    Each write is a function of the writer connection. Writes run in the order
+    they were submitted, each inside its own savepoint so one that raises is
+    rolled back on its own and its caller gets the exception, while the rest
+    of the batch still commits. Callers block until the batch is committed.
+    """
+
+    def __init__(self, pool, max_batch, max_latency, queue_size, enqueue_timeout):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, write, after_commit=None):
+        """Queue write(db) and return a Future for its result once committed.
+
+        after_commit(result) runs on the writer thread right after the commit,
+        in submission order, before the future resolves.
+        """
+        pending = PendingWrite(write, after_commit)
+        try:
+            self._queue.put(pending, timeout=self.enqueue_timeout)
+        except queue.Full:
+            raise WriteQueueFull("Too many writes are waiting; try again shortly")
+        WRITE_QUEUE_DEPTH.inc()
+        return pending.future
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch:
+            # take what is already queued, then wait up to max_latency for more
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        WRITE_QUEUE_DEPTH.dec(len(batch))
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._commit(batch)
+            except BaseException as e:
+                logger.exception("Group commit of %d writes failed", len(batch))
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+
+    def _commit(self, batch):
+        outcomes = []
+        with self.pool.write_lock:
+            db = self.pool.writer()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for pending in batch:
+                    db.execute("SAVEPOINT queued_write")
+                    try:
+                        result = pending.write(db)
+                    except Exception as e:
+                        db.execute("ROLLBACK TO queued_write")
+                        db.execute("RELEASE queued_write")
+                        outcomes.append((False, e))
+                    else:
+                        db.execute("RELEASE queued_write")
+                        outcomes.append((True, result))
+                db.execute("COMMIT")
+            except BaseException:
+                if db.in_transaction:
+                    db.execute("ROLLBACK")
+                raise
+        WRITE_BATCH_SIZE.observe(len(batch))
+
+        for pending, (ok, value) in zip(batch, outcomes):
+            if not ok:
+                pending.future.set_exception(value)
+                continue
+            if pending.after_commit is not None:
+                try:
+                    pending.after_commit(value)
+                except Exception:
+                    logger.exception("after_commit hook failed")
+            pending.future.set_result(value)
@@ -0,0 +1,159 @@
+import logging
+import os
+import queue
+import threading
+import time
+from flask import current_app
+from app.db.db import get_pool
+from app.metrics.registry import Gauge
+from app.models.event import get_event_bounds, get_events_after
+
+logger = logging.getLogger(__name__)
+
+STREAMS_OPEN = Gauge("event_streams_open", "Open /posts/stream connections in this process")
+
+# events read from the log per query, by the poller and by a stream catching up
+READ_BATCH = 500
+
+# one broadcaster per worker process, created on first use
+broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+class StreamLimitReached(RuntimeError):
+    """This process already has EVENTS_MAX_STREAMS streams open"""
+
+def format_event(row):
+    """The event as an SSE message; data is compact JSON, so it never spans lines"""
+    return f"id: {row['id']}\nevent: {row['event']}\ndata: {row['data']}\n\n"
+
+class Subscription:
+    """One stream's bounded buffer of (event id, message) pairs.
+
+    The poller never waits on a slow stream: when the buffer is full the event
+    is dropped and the stream is marked overflowed, and it then catches up by
+    reading the log itself.
+    """
+
+    def __init__(self, buffer_size):
+        self.events = queue.Queue(maxsize=buffer_size)
+        self.overflowed = False
+
+    def offer(self, event):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+class EventBroadcaster:
+    """Tails the post_events table and fans new events out to this process's streams.
+
+    Each worker process polls the shared log on its own, so a write committed
+    by any worker reaches streams in all of them. The poller runs only while a
+    stream is open, and formats each event once for every stream.
+    """
+
+    def __init__(self, pool, poll_interval, buffer_size, max_streams):
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.buffer_size = buffer_size
+        self.max_streams = max_streams
+        self.pid = os.getpid()
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._last_id = None
+        self._thread = threading.Thread(target=self._run, name='event-poller', daemon=True)
+        self._thread.start()
+
+    def _read(self, query, *args):
+        db = self.pool.acquire()
+        try:
+            return query(db, *args)
+        finally:
+            self.pool.release(db)
+
+    def bounds(self):
+        """(oldest, newest) event ids in the log"""
+        return self._read(get_event_bounds)
+
+    def replay(self, after_id):
+        """(id, message) for every logged event after after_id, read in batches"""
+        while True:
+            rows = self._read(get_events_after, after_id, READ_BATCH)
+            for row in rows:
+                yield row["id"], format_event(row)
+            if len(rows) < READ_BATCH:
+                return
+            after_id = rows[-1]["id"]
+
+    def subscribe(self):
+        with self._lock:
+            if self.max_streams and len(self._subscribers) >= self.max_streams:
+                raise StreamLimitReached("Too many open event streams; try again shortly")
+            if self._last_id is None:
+                # start at the current end of the log; streams replay anything older themselves
+                _, self._last_id = self.bounds()
+            subscription = Subscription(self.buffer_size)
+            self._subscribers.add(subscription)
+            self._active.set()
+        STREAMS_OPEN.inc()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription not in self._subscribers:
+                return
+            self._subscribers.discard(subscription)
+            if not self._subscribers:
+                self._active.clear()
+                self._last_id = None
+        STREAMS_OPEN.dec()
+
+    def _run(self):
+        while True:
+            self._active.wait()
+            try:
+                self._poll()
+            except Exception:
+                logger.exception("Polling the event log failed")
+            time.sleep(self.poll_interval)
+
+    def _poll(self):
+        while True:
+            with self._lock:
+                after_id = self._last_id
+            if after_id is None:
+                return
+
+            rows = self._read(get_events_after, after_id, READ_BATCH)
+            if not rows:
+                return
+
+            with self._lock:
+                # every stream closed (and maybe a new one opened) while reading
+                if self._last_id != after_id:
+                    return
+                self._last_id = rows[-1]["id"]
+                subscribers = list(self._subscribers)
+
+            events = [(row["id"], format_event(row)) for row in rows]
+            for subscription in subscribers:
+                for event in events:
+                    subscription.offer(event)
+
+            if len(rows) < READ_BATCH:
+                return
+
+def get_broadcaster():
+    """This process's broadcaster, started on first use (and again after a fork)"""
+    global broadcaster
+    with _broadcaster_lock:
+        if broadcaster is None or broadcaster.pid != os.getpid():
+            config = current_app.config
+            broadcaster = EventBroadcaster(
+                get_pool(),
+                config['EVENTS_POLL_INTERVAL_MS'] / 1000.0,
+                config['EVENTS_BUFFER_SIZE'],
+                config['EVENTS_MAX_STREAMS']
+            )
+        return broadcaster
@@ -0,0 +1,104 @@
+# Metrics across gunicorn workers. Each worker keeps its own registry and
+# writes a snapshot of it to <METRICS_DIR>/<pid>.json about once a second; a
+# scrape, which lands on any one worker, sums every live worker's file.
+# When a worker exits, gunicorn's child_exit hook calls mark_process_dead():
+# its counters and histograms are folded into dead.json so totals never go
+# backwards, and its gauges are dropped since they described that process only.
+import json
+import logging
+import os
+import threading
+import time
+from app.metrics.registry import REGISTRY, render_snapshot
+
+logger = logging.getLogger(__name__)
+
+DEAD_FILE = "dead.json"
+
+def snapshot_path(directory, pid):
+    return os.path.join(directory, f"{pid}.json")
+
+def write_json(path, data):
+    """Replace path atomically so readers never see a half-written file"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def write_snapshot(directory, registry=REGISTRY, pid=None):
+    write_json(snapshot_path(directory, pid or os.getpid()), registry.snapshot())
+
+def read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # removed by mark_process_dead between listing and reading
+        return None
+
+def collect_snapshots(directory):
+    snapshots = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            snapshot = read_snapshot(os.path.join(directory, name))
+            if snapshot is not None:
+                snapshots.append(snapshot)
+    return snapshots
+
+def merge_snapshots(snapshots, kinds=None):
+    """Sum snapshots child by child; `kinds` limits the merge to those metric kinds"""
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            if kinds is not None and metric["kind"] not in kinds:
+                continue
+            target = merged.setdefault(name, dict(metric, children=[]))
+            children = {tuple(values): value for values, value in target["children"]}
+            for values, value in metric["children"]:
+                key = tuple(values)
+                if key not in children:
+                    children[key] = value
+                elif metric["kind"] == "histogram":
+                    counts, total = children[key]
+                    children[key] = [[a + b for a, b in zip(counts, value[0])], total + value[1]]
+                else:
+                    children[key] = children[key] + value
+            target["children"] = [[list(values), value] for values, value in children.items()]
+    return merged
+
+def render_all(directory):
+    """Exposition of every worker's metrics summed, with this worker's up to date"""
+    write_snapshot(directory)
+    return render_snapshot(merge_snapshots(collect_snapshots(directory)))
+
+def mark_process_dead(directory, pid):
+    """Fold an exited worker's counters and histograms into dead.json and drop its file.
+
+    Called from the gunicorn master only, so dead.json has a single writer.
+    """
+    path = snapshot_path(directory, pid)
+    snapshot = read_snapshot(path)
+    if snapshot is None:
+        return
+    dead_path = os.path.join(directory, DEAD_FILE)
+    dead = read_snapshot(dead_path) or {}
+    write_json(dead_path, merge_snapshots([dead, snapshot], kinds=("counter", "histogram")))
+    os.remove(path)
+
+def start_worker(directory, interval):
+    """Call in each worker right after the fork to write its snapshot every `interval` seconds.
+
+    Values inherited from the master (its warm-up request) are zeroed first,
+    or every worker would report them again.
+    """
+    REGISTRY.reset()
+
+    def flush():
+        while True:
+            try:
+                write_snapshot(directory)
+            except Exception:
+                logger.exception("Could not write metrics snapshot to %s", directory)
+            time.sleep(interval)
+
+    threading.Thread(target=flush, name="metrics-flusher", daemon=True).start()
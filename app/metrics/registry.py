@@ -0,0 +1,205 @@
+import bisect
+import math
+import threading
+
+# Minimal Prometheus client: counters, gauges and histograms with labels,
+# rendered in the text exposition format by render_metrics(). Values are
+# per process; app.metrics.multiprocess combines the workers' snapshots.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values):
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self.new_child())
+        return child
+
+    def new_child(self):
+        raise NotImplementedError
+
+    def snapshot(self):
+        """JSON-serializable state: kind, help text, label names and [label values, value] per child"""
+        with self._lock:
+            children = list(self._children.items())
+        return {
+            "kind": self.kind,
+            "documentation": self.documentation,
+            "labelnames": list(self.labelnames),
+            "children": [[list(values), child.get()] for values, child in children],
+        }
+
+    def reset(self):
+        # zeroed in place: callers may hold a child from labels() (e.g. LRUCache's hit/miss counters)
+        with self._lock:
+            children = list(self._children.values())
+        for child in children:
+            child.reset()
+
+    # unlabelled metrics forward straight to their only child
+    def __getattr__(self, attr):
+        if attr in ("inc", "dec", "set", "observe"):
+            return getattr(self.labels(), attr)
+        raise AttributeError(attr)
+
+class CounterValue:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def get(self):
+        return self.value
+
+    def reset(self):
+        with self._lock:
+            self.value = 0.0
+
+class GaugeValue(CounterValue):
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+class HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def get(self):
+        """[count per bucket (not cumulative, +Inf last), sum]"""
+        with self._lock:
+            return [list(self.counts), self.sum]
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.sum = 0.0
+
+class Counter(Metric):
+    kind = "counter"
+
+    def new_child(self):
+        return CounterValue()
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def new_child(self):
+        return GaugeValue()
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def new_child(self):
+        return HistogramValue(self.buckets)
+
+    def snapshot(self):
+        snapshot = super().snapshot()
+        snapshot["buckets"] = list(self.buckets)
+        return snapshot
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def snapshot(self):
+        """{metric name: Metric.snapshot()} for every registered metric"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def reset(self):
+        """Zero every recorded value, keeping the metrics and their labelled children"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    def render(self):
+        return render_snapshot(self.snapshot())
+
+def histogram_samples(name, labelnames, values, buckets, counts, total):
+    cumulative = 0
+    for bound, count in zip(list(buckets) + [math.inf], counts):
+        cumulative += count
+        yield f"{name}_bucket{format_labels(labelnames, values, ('le', format_value(bound)))} {cumulative}"
+    yield f"{name}_sum{format_labels(labelnames, values)} {format_value(total)}"
+    yield f"{name}_count{format_labels(labelnames, values)} {cumulative}"
+
+def render_snapshot(snapshot):
+    """Text exposition of a Registry.snapshot(), or of several merged into one"""
+    lines = []
+    for name, metric in snapshot.items():
+        lines.append(f"# HELP {name} {metric['documentation']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        labelnames = metric["labelnames"]
+        for values, value in sorted(metric["children"], key=lambda child: child[0]):
+            if metric["kind"] == "histogram":
+                lines.extend(histogram_samples(name, labelnames, values, metric["buckets"], *value))
+            else:
+                lines.append(f"{name}{format_labels(labelnames, values)} {format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def render_metrics():
+    return REGISTRY.render()
+
+# shared by every in-process cache (tokens, users, feed pages, ...)
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by cache and result", ["cache", "result"])
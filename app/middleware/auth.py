@@ -1,45 +1,196 @@
 import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
 from functools import wraps
 from flask import request, jsonify, g, current_app
-from auth0_api_python import ApiClient, ApiClientOptions
-from auth0_api_python.errors import BaseAuthError
+from app.cache.lru import LRUCache
+from app.metrics.registry import Histogram
+from app.middleware.ratelimit import limit_client
 
-# Initialize Auth0 API client
+logger = logging.getLogger(__name__)
+
+AUTH_VERIFY_SECONDS = Histogram("auth_verify_seconds", "Time spent verifying access tokens that missed the token cache", ["result"])
+
+# Auth0 API client; created on first use by get_api_client() because importing
+# auth0_api_python (and authlib behind it) is the slowest part of startup
 api_client = None
+_api_client_lock = threading.Lock()
+_auth_config = None
+
+# verified claims keyed by sha256(token), evicted at the token's exp
+token_cache = None
+
+# discovery metadata and JWKS, refreshed in the background
+key_cache = None
+
+# long-lived event loop the async ApiClient runs on (one per worker process)
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+_verify_timeout = None
+_refresh_interval = None
+
+class KeyCache:
+    """Discovery/JWKS cache whose entries never expire on the request path.
+
+    Entries are replaced by refresh_keys() on the auth loop, so after the first
+    fetch a request never waits on the network for keys. Only the auth loop
+    thread touches it, so no locking is needed. Implements auth0_api_python's
+    CacheAdapter interface without importing it at startup.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, value, ttl_seconds=None):
+        self._entries[key] = value
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def keys(self):
+        return list(self._entries)
 
 def init_auth(app):
+    global api_client, token_cache, key_cache, _auth_config, _verify_timeout, _refresh_interval
+    key_cache = KeyCache()
+    api_client = None
+    _auth_config = (app.config['AUTH0_DOMAIN'], app.config['AUTH0_AUDIENCE'])
+    token_cache = LRUCache(app.config['TOKEN_CACHE_SIZE'], ttl=app.config['TOKEN_CACHE_MAX_TTL'], name="auth_tokens")
+    _verify_timeout = app.config['AUTH_VERIFY_TIMEOUT']
+    _refresh_interval = app.config['JWKS_REFRESH_INTERVAL']
+
+def get_api_client():
+    """The Auth0 API client, imported and built on first use"""
     global api_client
-    api_client = ApiClient(ApiClientOptions(
-        domain=app.config['AUTH0_DOMAIN'],
-        audience=app.config['AUTH0_AUDIENCE']
-    ))
+    if api_client is None:
+        with _api_client_lock:
+            if api_client is None:
+                from auth0_api_python import ApiClient, ApiClientOptions
+                domain, audience = _auth_config
+                api_client = ApiClient(ApiClientOptions(domain=domain, audience=audience, cache_adapter=key_cache))
+    return api_client
+
+def get_auth_loop():
+    """Return this process's auth event loop, starting it on first use (and again after a fork)"""
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name='auth-loop', daemon=True).start()
+            _loop.call_soon_threadsafe(_schedule_refresh, _loop)
+        return _loop
+
+def _schedule_refresh(loop):
+    loop.call_later(_refresh_interval, lambda: loop.create_task(refresh_keys(loop)))
+
+async def refresh_keys(loop=None):
+    """Re-fetch every cached discovery document and JWKS, keeping the old copy on failure"""
+    from auth0_api_python.utils import fetch_jwks, fetch_oidc_metadata
+    custom_fetch = get_api_client().options.custom_fetch
+    for key in key_cache.keys():
+        cached = key_cache.get(key)
+        try:
+            if cached and "jwks_uri" in cached:
+                domain = key.replace('https://', '').rstrip('/')
+                value, _ = await fetch_oidc_metadata(domain=domain, custom_fetch=custom_fetch)
+            else:
+                value, _ = await fetch_jwks(jwks_uri=key, custom_fetch=custom_fetch)
+            key_cache.set(key, value)
+        except Exception as e:
+            logger.error("Failed to refresh auth keys from %s: %s", key, e)
+
+    if loop is not None:
+        _schedule_refresh(loop)
+
+def warm_keys():
+    """Fetch the discovery document and JWKS now, e.g. in a prefork master so every worker inherits them"""
+    client = get_api_client()
+
+    async def fetch():
+        # the client's own loaders, so entries land under the keys it looks up
+        metadata = await client._discover()
+        await client._fetch_jwks(metadata["jwks_uri"])
+
+    try:
+        asyncio.run(fetch())
+    except Exception as e:
+        logger.warning("Could not prefetch auth keys; workers will fetch them on first use: %s", e)
+
+def token_cache_key(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def cached_claims(token):
+    """Claims of a token verified earlier and still cached, or None"""
+    return token_cache.get(token_cache_key(token))
+
+def verify_token(token):
+    """Verify an access token, reusing the claims of tokens verified earlier"""
+    cache_key = token_cache_key(token)
+    claims = token_cache.get(cache_key)
+    if claims is not None:
+        return claims
+
+    started = time.perf_counter()
+    future = asyncio.run_coroutine_threadsafe(get_api_client().verify_access_token(token), get_auth_loop())
+    try:
+        claims = future.result(timeout=_verify_timeout)
+    except Exception:
+        AUTH_VERIFY_SECONDS.labels("error").observe(time.perf_counter() - started)
+        raise
+    AUTH_VERIFY_SECONDS.labels("ok").observe(time.perf_counter() - started)
+    token_cache.set(cache_key, claims, expires_at=claims.get('exp'))
+    return claims
 
 def require_auth(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         auth_header = request.headers.get("Authorization", "")
         
-        print(f"[DEBUG] Auth header received: {auth_header[:50]}...")
-        
         if not auth_header.startswith("Bearer "):
             return jsonify({"error": "Missing or invalid authorization header"}), 401
         
         token = auth_header.split(" ")[1]
         
-        print(f"[DEBUG] Token segments: {len(token.split('.'))}")
-        
-        try:
-            claims = asyncio.run(api_client.verify_access_token(token))
-            g.user_claims = claims
-            print(f"[DEBUG] Token verified successfully for user: {claims.get('sub')}")
-            return f(*args, **kwargs)
-        except BaseAuthError as e:
-            print(f"[ERROR] Auth error: {str(e)}")
-            return jsonify({"error": str(e)}), e.get_status_code()
-        except Exception as e:
-            print(f"[ERROR] Unexpected error: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({"error": "Token validation failed", "details": str(e)}), 401
-    
+        claims = cached_claims(token)
+        if claims is None:
+            # a token that has to be verified is charged to the client's IP first,
+            # so invalid tokens (never cached) can't be sent without limit
+            limited = limit_client(f"ip:{request.remote_addr}")
+            if limited is not None:
+                return limited
+
+            try:
+                claims = verify_token(token)
+            except Exception as e:
+                # already imported by the time verification can fail
+                from auth0_api_python.errors import BaseAuthError
+                if isinstance(e, BaseAuthError):
+                    logger.info("Auth error: %s", e)
+                    return jsonify({"error": str(e)}), e.get_status_code()
+                logger.exception("Unexpected error verifying token")
+                return jsonify({"error": "Token validation failed", "details": str(e)}), 401
+
+        g.user_claims = claims
+        logger.debug("Token verified for user: %s", claims.get('sub'))
+
+        limited = limit_client(f"user:{claims.get('sub')}")
+        if limited is not None:
+            return limited
+
+        # errors raised by the view itself (e.g. 413 from an upload) are not token failures
+        return f(*args, **kwargs)
+
+    # tells the per-IP limiter to leave this route to require_auth
+    decorated_function.requires_auth = True
     return decorated_function
\ No newline at end of file
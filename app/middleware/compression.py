@@ -0,0 +1,58 @@
+from itertools import chain
+from flask import request
+from werkzeug.wsgi import ClosingIterator
+from app.utils.compression import compress_body, compress_stream, negotiate_encoding
+
+# only JSON is compressed; images are already compressed formats
+COMPRESSIBLE_MIMETYPES = ("application/json",)
+
+def init_compression(app):
+    """Compress /api JSON responses with the best encoding the client accepts"""
+    if not app.config['COMPRESS_ENABLED']:
+        return
+
+    min_size = app.config['COMPRESS_MIN_SIZE']
+
+    @app.after_request
+    def compress_response(response):
+        if not request.path.startswith('/api/') or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        # already encoded (e.g. a precompressed feed page), or nothing to compress
+        if 'Content-Encoding' in response.headers or response.status_code != 200 or response.direct_passthrough:
+            return response
+
+        encoding = negotiate_encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            # closing the new iterable must still close the original (and pop its request context)
+            close = getattr(response.response, 'close', None)
+            chunks = response.iter_encoded()
+
+            # read ahead until the body is known to reach min_size
+            head = []
+            size = 0
+            for chunk in chunks:
+                head.append(chunk)
+                size += len(chunk)
+                if size >= min_size:
+                    break
+            else:
+                response.response = ClosingIterator([b"".join(head)], close)
+                response.headers['Content-Length'] = str(size)
+                return response
+
+            # the rest is compressed chunk by chunk as it is generated
+            response.response = ClosingIterator(compress_stream(chain(head, chunks), encoding), close)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            response.set_data(compress_body(data, encoding))
+
+        response.headers['Content-Encoding'] = encoding
+        return response
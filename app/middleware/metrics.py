@@ -0,0 +1,35 @@
+import time
+from flask import g, request
+from app.metrics.registry import Counter, Gauge, Histogram
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency by endpoint, including streamed bodies", ["method", "endpoint"])
+RESPONSES = Counter("http_responses_total", "Responses by endpoint and status code", ["method", "endpoint", "status"])
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled")
+
+def endpoint_label():
+    # the URL rule, not the raw path, keeps label cardinality bounded
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+def init_metrics(app):
+    """Record per-endpoint latency, status counts and in-flight requests"""
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        IN_FLIGHT.inc()
+
+    @app.after_request
+    def count_response(response):
+        RESPONSES.labels(request.method, endpoint_label(), str(response.status_code)).inc()
+        return response
+
+    # teardown runs once a streamed body has been fully sent
+    @app.teardown_request
+    def stop_timer(error=None):
+        started = g.pop('request_started', None)
+        if started is None:
+            return
+        IN_FLIGHT.dec()
+        REQUEST_SECONDS.labels(request.method, endpoint_label()).observe(time.perf_counter() - started)
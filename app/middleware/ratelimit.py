@@ -0,0 +1,142 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, jsonify, request
+from app.metrics.registry import Counter
+
+REJECTED = Counter("http_requests_rejected_total", "Requests turned away before reaching the view", ["reason"])
+
+READ_METHODS = ("GET", "HEAD")
+
+# budgets and in-flight counts are per process; with N workers a client can get N times the rate
+limiters = None
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+_max_in_flight = 0
+_max_queue_seconds = 0
+
+class TokenBuckets:
+    """Token buckets keyed by client, refilled at `rate` tokens per second up to `burst`.
+
+    Only the `maxsize` most recently seen clients are tracked; a client that
+    falls off simply starts again with a full bucket.
+    """
+
+    def __init__(self, rate, burst, maxsize):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Take one token for key; returns 0 if allowed, else seconds until a token is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+def exempt(f):
+    """Mark a view as exempt from rate limits and load shedding (probes, metrics)"""
+    f.rate_limit_exempt = True
+    return f
+
+def too_many_requests(wait, message="Too many requests"):
+    response = jsonify({"error": message})
+    response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+    return response, 429
+
+def service_unavailable(message):
+    response = jsonify({"error": message})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def limit_client(key):
+    """Charge one request to key's read or write budget; returns a 429 response or None"""
+    if limiters is None or request.method == "OPTIONS":
+        return None
+
+    kind = "read" if request.method in READ_METHODS else "write"
+    wait = limiters[kind].take(key)
+    if not wait:
+        return None
+    REJECTED.labels(f"rate_limited_{kind}").inc()
+    return too_many_requests(wait)
+
+def queue_seconds():
+    """Seconds the request waited in front of the app, from the proxy's X-Request-Start header"""
+    header = request.headers.get('X-Request-Start', '')
+    try:
+        started = float(header.replace('t=', '', 1))
+    except ValueError:
+        return None
+
+    # nginx sends seconds, other proxies milliseconds or microseconds
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    return time.time() - started
+
+def init_rate_limits(app):
+    """Per-client token buckets plus concurrency-based load shedding"""
+    global limiters, _max_in_flight, _max_queue_seconds
+    config = app.config
+    _max_in_flight = config['SHED_MAX_IN_FLIGHT']
+    _max_queue_seconds = config['SHED_MAX_QUEUE_MS'] / 1000.0
+    if config['RATE_LIMIT_ENABLED']:
+        limiters = {
+            "read": TokenBuckets(config['RATE_LIMIT_READ_PER_SEC'], config['RATE_LIMIT_READ_BURST'], config['RATE_LIMIT_MAX_CLIENTS']),
+            "write": TokenBuckets(config['RATE_LIMIT_WRITE_PER_SEC'], config['RATE_LIMIT_WRITE_BURST'], config['RATE_LIMIT_MAX_CLIENTS']),
+        }
+    else:
+        limiters = None
+
+    @app.before_request
+    def admit_request():
+        global _in_flight
+        view = current_app.view_functions.get(request.endpoint)
+        if view is None or getattr(view, 'rate_limit_exempt', False):
+            return None
+
+        # shed load first: it is the cheapest check and protects everyone
+        if _max_queue_seconds:
+            waited = queue_seconds()
+            if waited is not None and waited > _max_queue_seconds:
+                REJECTED.labels("queue_latency").inc()
+                return service_unavailable("Server is overloaded; try again shortly")
+
+        with _in_flight_lock:
+            if _max_in_flight and _in_flight >= _max_in_flight:
+                shed = True
+            else:
+                shed = False
+                _in_flight += 1
+        if shed:
+            REJECTED.labels("overloaded").inc()
+            return service_unavailable("Server is overloaded; try again shortly")
+        g.admitted = True
+
+        # routes behind require_auth are limited per user once the token is verified,
+        # and per IP only when a token has to be verified (see require_auth)
+        if not getattr(view, 'requires_auth', False):
+            return limit_client(f"ip:{request.remote_addr}")
+        return None
+
+    # teardown runs once a streamed body has been fully sent
+    @app.teardown_request
+    def release_request(error=None):
+        global _in_flight
+        if g.pop('admitted', False):
+            with _in_flight_lock:
+                _in_flight -= 1
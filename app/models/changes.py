@@ -0,0 +1,80 @@
+from app.db.db import get_db, get_data_version
+from app.models.post import POST_PAGE_COLUMNS
+
+# picks the end of a delta page: change versions after `since`, oldest first,
+# across changed posts, comments and tombstones
+CHANGE_VERSIONS_SQL = """
+    SELECT change_version FROM (
+        SELECT change_version FROM images WHERE change_version > ?
+        UNION ALL
+        SELECT change_version FROM comments WHERE change_version > ?
+        UNION ALL
+        SELECT change_version FROM deleted_posts WHERE change_version > ?
+    )
+    ORDER BY change_version
+    LIMIT ?
+"""
+
+def get_change_bound(db, since, version, limit):
+    """Newest change version to include after `since`, keeping a page near `limit` rows.
+
+    Returns (until, has_more). Rows written together share a version and are
+    never split across pages, so one large write can exceed the limit.
+    """
+    versions = [row[0] for row in db.execute(CHANGE_VERSIONS_SQL, (since, since, since, limit + 1))]
+    if len(versions) <= limit:
+        return version, False
+
+    cutoff = versions[limit]
+    until = cutoff - 1 if versions[0] < cutoff else cutoff
+    return until, until < version
+
+# returns everything that changed in (since, until]: posts (with the columns
+# for `fields`, see POST_PAGE_COLUMNS), comments and deleted post ids, each
+# in change order
+def get_changes_between(db, since, until, fields):
+    columns = ["i.id", "i.uploaded_at", "i.updated_at"]
+    for field in fields:
+        columns.extend(POST_PAGE_COLUMNS.get(field, []))
+    join = "JOIN users u ON i.user_id = u.id" if "username" in fields else ""
+
+    posts = db.execute(f"""
+        SELECT {", ".join(columns)}
+        FROM images i
+        {join}
+        WHERE i.change_version > ? AND i.change_version <= ?
+        ORDER BY i.change_version, i.id
+    """, (since, until)).fetchall()
+
+    comments = db.execute("""
+        SELECT c.id, c.image_id, c.comment_text, c.created_at, u.username
+        FROM comments c
+        JOIN users u ON c.user_id = u.id
+        WHERE c.change_version > ? AND c.change_version <= ?
+        ORDER BY c.change_version, c.id
+    """, (since, until)).fetchall()
+
+    deleted = [row[0] for row in db.execute(
+        "SELECT post_id FROM deleted_posts WHERE change_version > ? AND change_version <= ? ORDER BY change_version",
+        (since, until)
+    )]
+
+    return posts, comments, deleted
+
+# one page of changes after `since` from a single snapshot, so the returned
+# version covers exactly the rows returned. Returns (version, until, has_more,
+# posts, comments, deleted); `since` of None means a full sync
+def get_changes(since, limit, fields):
+    db = get_db()
+    db.execute("BEGIN")
+    try:
+        version = get_data_version(db)
+        # rows written before change tracking carry version 0
+        since = -1 if since is None else since
+        until, has_more = get_change_bound(db, since, version, limit)
+        posts, comments, deleted = get_changes_between(db, since, until, fields)
+    finally:
+        # read-only; this just releases the snapshot
+        db.rollback()
+
+    return version, until, has_more, posts, comments, deleted
@@ -1,19 +1,125 @@
 import time
-from app.db.db import get_db
+from app.db.db import get_db, run_write, bump_data_version
+from app.cache.feed import get_feed_cache
+from app.models.event import publish_event
 
+def insert_comment(db, image_id, user_id, comment_text, created_at, change_version):
+    comment_id = db.execute(
+        "INSERT INTO comments (image_id, user_id, comment_text, created_at, change_version) VALUES (?, ?, ?, ?, ?) RETURNING id",
+        (image_id, user_id, comment_text, created_at, change_version)
+    ).fetchone()[0]
+    db.execute("UPDATE images SET comment_count = comment_count + 1 WHERE id = ?", (image_id,))
+    publish_event(db, "comment_created", comment_id=comment_id, post_id=image_id, user_id=user_id, created_at=created_at)
+    return comment_id
+
+# returns the new comment's id, or None if the post does not exist
 def create_comment(image_id, user_id, comment_text):
-    db = get_db()
-    db.execute(
-        "INSERT INTO comments (image_id, user_id, comment_text, created_at) VALUES (?, ?, ?, ?)",
-        (image_id, user_id, comment_text, int(time.time()))
-    )
-    db.commit()
+    feed_cache = get_feed_cache()
+
+    def write(db):
+        if not db.execute("SELECT 1 FROM images WHERE id = ?", (image_id,)).fetchone():
+            return None, None
+        version = bump_data_version(db)
+        comment_id = insert_comment(db, image_id, user_id, comment_text, int(time.time()), version)
+        return comment_id, version
+
+    def after_commit(result):
+        comment_id, version = result
+        if comment_id is not None:
+            feed_cache.note_write(version, post_ids=[image_id])
+
+    comment_id, _ = run_write(write, after_commit)
+    return comment_id
+
+# inserts (image_id, comment_text) pairs in one transaction and returns a
+# comment id per pair, or None where the post does not exist
+def create_comments(user_id, comments):
+    if not comments:
+        return []
+
+    feed_cache = get_feed_cache()
+    image_ids = sorted({image_id for image_id, _ in comments})
+    placeholders = ", ".join("?" for _ in image_ids)
+
+    def write(db):
+        now = int(time.time())
+        existing = {row[0] for row in db.execute(f"SELECT id FROM images WHERE id IN ({placeholders})", image_ids)}
+        commented = sorted({image_id for image_id, _ in comments if image_id in existing})
+        version = bump_data_version(db) if commented else None
+        comment_ids = [
+            insert_comment(db, image_id, user_id, comment_text, now, version) if image_id in existing else None
+            for image_id, comment_text in comments
+        ]
+        return comment_ids, version, commented
+
+    def after_commit(result):
+        _, version, commented = result
+        if commented:
+            feed_cache.note_write(version, post_ids=commented)
+
+    comment_ids, _, _ = run_write(write, after_commit)
+    return comment_ids
 
-def get_comments_for_post(post_id):
+# returns comments oldest first; with a limit, starts strictly after the
+# (created_at, id) key in `after`
+def get_comments_for_post(post_id, limit=None, after=None):
     db = get_db()
+
+    if limit is None:
+        return db.execute("""
+            SELECT c.id, c.comment_text, c.created_at, u.username 
+            FROM comments c 
+            JOIN users u ON c.user_id = u.id 
+            WHERE c.image_id = ?
+            ORDER BY c.created_at, c.id
+        """, (post_id,)).fetchall()
+
+    if after is None:
+        after = (-1, -1)
+
     return db.execute("""
-        SELECT c.comment_text, u.username 
+        SELECT c.id, c.comment_text, c.created_at, u.username 
         FROM comments c 
         JOIN users u ON c.user_id = u.id 
-        WHERE c.image_id = ?
-    """, (post_id,)).fetchall()
\ No newline at end of file
+        WHERE c.image_id = ? AND (c.created_at, c.id) > (?, ?)
+        ORDER BY c.created_at, c.id
+        LIMIT ?
+    """, (post_id, after[0], after[1], limit)).fetchall()
+
+# loads the first `per_post_limit` comments of every post in two queries and
+# returns {post_id: (comments, comment_count)}; each post's comments are read
+# from idx_comments_image up to the limit, however long its thread is
+def get_comments_for_posts(post_ids, per_post_limit):
+    if not post_ids:
+        return {}
+
+    db = get_db()
+    placeholders = ", ".join("?" for _ in post_ids)
+    counts = {
+        row["id"]: row["comment_count"]
+        for row in db.execute(f"SELECT id, comment_count FROM images WHERE id IN ({placeholders})", post_ids)
+    }
+    commented = [post_id for post_id in post_ids if counts.get(post_id)]
+    if not commented:
+        return {}
+
+    first_comments = """
+        SELECT * FROM (
+            SELECT c.image_id, c.id, c.comment_text, c.created_at, u.username
+            FROM comments c
+            JOIN users u ON c.user_id = u.id
+            WHERE c.image_id = ?
+            ORDER BY c.created_at, c.id
+            LIMIT ?
+        )
+    """
+    params = []
+    for post_id in commented:
+        params.extend((post_id, per_post_limit))
+    rows = db.execute(" UNION ALL ".join([first_comments] * len(commented)), params).fetchall()
+
+    grouped = {post_id: ([], counts[post_id]) for post_id in commented}
+    for row in rows:
+        grouped[row["image_id"]][0].append(row)
+
+    return grouped
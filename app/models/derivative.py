@@ -0,0 +1,85 @@
+import time
+from app.db.db import get_db
+
+def image_in_use(db, image_hash):
+    return db.execute("SELECT 1 FROM images WHERE image_hash = ? LIMIT 1", (image_hash,)).fetchone() is not None
+
+# marks the derivatives of an image as pending and returns the sizes that now
+# need rendering; sizes that are already ready are left alone unless `force`.
+# Nothing is pending for an image no post uses anymore
+def mark_pending(db, source_hash, sizes, force=False):
+    if not image_in_use(db, source_hash):
+        return []
+    now = int(time.time())
+    condition = "" if force else "WHERE image_derivatives.status != 'ready'"
+    pending = []
+    for size in sizes:
+        row = db.execute(f"""
+            INSERT INTO image_derivatives (source_hash, size, status, updated_at) VALUES (?, ?, 'pending', ?)
+            ON CONFLICT (source_hash, size) DO UPDATE SET status = 'pending', error = NULL, updated_at = excluded.updated_at
+            {condition}
+            RETURNING size
+        """, (source_hash, size, now)).fetchone()
+        if row:
+            pending.append(size)
+    return pending
+
+def record_derivative(db, source_hash, size, blob_hash, byte_size, width, height):
+    db.execute("""
+        UPDATE image_derivatives
+        SET status = 'ready', blob_hash = ?, byte_size = ?, width = ?, height = ?, error = NULL, updated_at = ?
+        WHERE source_hash = ? AND size = ?
+    """, (blob_hash, byte_size, width, height, int(time.time()), source_hash, size))
+
+def record_failure(db, source_hash, size, error):
+    db.execute(
+        "UPDATE image_derivatives SET status = 'failed', error = ?, updated_at = ? WHERE source_hash = ? AND size = ?",
+        (error, int(time.time()), source_hash, size)
+    )
+
+def get_derivative(source_hash, size):
+    db = get_db()
+    return db.execute(
+        "SELECT status, blob_hash, updated_at FROM image_derivatives WHERE source_hash = ? AND size = ?",
+        (source_hash, size)
+    ).fetchone()
+
+# removes the derivative rows of an image and returns the blob hashes that no
+# derivative or post references anymore
+def delete_derivatives(db, source_hash):
+    blob_hashes = [row[0] for row in db.execute(
+        "DELETE FROM image_derivatives WHERE source_hash = ? RETURNING blob_hash", (source_hash,)
+    ) if row[0]]
+    return unreferenced_blobs(db, blob_hashes)
+
+# the blob hashes that no derivative or post references
+def unreferenced_blobs(db, blob_hashes):
+    unused = []
+    for blob_hash in set(blob_hashes):
+        in_use = db.execute("""
+            SELECT 1 FROM image_derivatives WHERE blob_hash = ?
+            UNION ALL
+            SELECT 1 FROM images WHERE image_hash = ?
+            LIMIT 1
+        """, (blob_hash, blob_hash)).fetchone()
+        if not in_use:
+            unused.append(blob_hash)
+    return unused
+
+# returns up to `limit` distinct stored images after `after_hash`, ordered by
+# hash, whose derivatives are missing or not ready (all of them with `force`)
+def get_images_needing_derivatives(sizes, after_hash, limit, force=False):
+    db = get_db()
+    placeholders = ", ".join("?" for _ in sizes)
+    condition = "" if force else f"""
+        AND (SELECT COUNT(*) FROM image_derivatives d
+             WHERE d.source_hash = i.image_hash AND d.status = 'ready' AND d.size IN ({placeholders})) < ?
+    """
+    params = (after_hash,) + (() if force else (*sizes, len(sizes))) + (limit,)
+    return [row[0] for row in db.execute(f"""
+        SELECT DISTINCT i.image_hash FROM images i
+        WHERE i.image_hash IS NOT NULL AND i.image_hash > ?
+        {condition}
+        ORDER BY i.image_hash
+        LIMIT ?
+    """, params)]
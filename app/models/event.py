@@ -0,0 +1,32 @@
+import json
+import time
+
+# events kept for Last-Event-ID resume; older ones are pruned every PRUNE_EVERY writes
+EVENTS_RETAINED = 10000
+PRUNE_EVERY = 100
+
+# appends an event inside the caller's write transaction, so it is visible
+# exactly when the change it describes is, and returns its id. `data` holds
+# ids and metadata only, never image bytes
+def publish_event(db, event, **data):
+    event_id = db.execute(
+        "INSERT INTO post_events (event, data, created_at) VALUES (?, ?, ?) RETURNING id",
+        (event, json.dumps(data, separators=(",", ":")), int(time.time()))
+    ).fetchone()[0]
+
+    if event_id % PRUNE_EVERY == 0:
+        db.execute("DELETE FROM post_events WHERE id <= ?", (event_id - EVENTS_RETAINED,))
+    return event_id
+
+# returns up to `limit` events with ids greater than after_id, oldest first
+def get_events_after(db, after_id, limit):
+    return db.execute(
+        "SELECT id, event, data FROM post_events WHERE id > ? ORDER BY id LIMIT ?",
+        (after_id, limit)
+    ).fetchall()
+
+# returns (oldest, newest) retained event ids; (None, 0) while the log is empty.
+# min() and max() in one select would scan the log; each alone reads one end
+def get_event_bounds(db):
+    row = db.execute("SELECT (SELECT min(id) FROM post_events), (SELECT max(id) FROM post_events)").fetchone()
+    return row[0], row[1] or 0
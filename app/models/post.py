@@ -1,46 +1,209 @@
+import logging
 import time
-from app.db.db import get_db
+from app.db.db import get_db, run_write, bump_data_version
+from app.cache.feed import get_feed_cache
+from app.models.event import publish_event
+from app.storage.blobs import delete_blob, get_store_root
+from app.storage.derivatives import schedule_derivatives
+from app.models.derivative import delete_derivatives, image_in_use
 
-def add_post(user_id, filename, description, base64_image, mime_type):
-    db = get_db()
-    db.execute(
-        "INSERT INTO images (user_id, name, description, base64_image, mime_type, uploaded_at) VALUES (?, ?, ?, ?, ?, ?)",
-        (user_id, filename, description, base64_image, mime_type, int(time.time()))
-    )
-    db.commit()
+logger = logging.getLogger(__name__)
+
+# store_blob() puts the image in the blob store and returns (image_hash,
+# image_size); it runs inside the write, so release_blob can't remove a blob
+# between it being stored and the post that references it being inserted.
+# With the write queue it runs on the writer thread, so it must not need an app context
+def add_post(user_id, filename, description, store_blob, mime_type):
+    feed_cache = get_feed_cache()
+    image_hash = None
+
+    def write(db):
+        nonlocal image_hash
+        image_hash, image_size = store_blob()
+        version = bump_data_version(db)
+        uploaded_at = int(time.time())
+        post_id = db.execute(
+            "INSERT INTO images (user_id, name, description, image_hash, image_size, mime_type, uploaded_at, updated_at, change_version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) RETURNING id",
+            (user_id, filename, description, image_hash, image_size, mime_type, uploaded_at, uploaded_at, version)
+        ).fetchone()[0]
+        publish_event(db, "post_created", post_id=post_id, user_id=user_id, mime_type=mime_type, uploaded_at=uploaded_at)
+        return version
+
+    run_write(write, after_commit=lambda version: feed_cache.note_write(version, new_post=True))
+    schedule_derivatives(image_hash)
+
+# columns selected for each optional feed field; id and uploaded_at are always
+# selected because the pagination cursor is built from them
+POST_PAGE_COLUMNS = {
+    "description": ["i.description"],
+    "username": ["u.username"],
+    "mime_type": ["i.mime_type"],
+    "image": ["i.image_hash", "i.base64_image IS NOT NULL AS has_inline_image"],
+    # just the hash that versions an image URL, without touching a legacy inline image
+    "image_url": ["i.image_hash"],
+}
 
-def get_all_posts():
+# returns up to `limit` posts ordered newest first, starting strictly after the
+# (uploaded_at, id) key in `before`; pass limit + 1 to find out if more remain.
+# `fields` limits the selected columns to those keys of POST_PAGE_COLUMNS
+def get_posts_page(limit, before=None, fields=None):
     db = get_db()
-    post_rows = db.execute("""
-        SELECT i.id, i.description, i.uploaded_at, u.username, i.base64_image, i.mime_type 
+    fields = POST_PAGE_COLUMNS if fields is None else fields
+
+    columns = ["i.id", "i.uploaded_at"]
+    for field in fields:
+        columns.extend(POST_PAGE_COLUMNS.get(field, []))
+    join = "JOIN users u ON i.user_id = u.id" if "username" in fields else ""
+
+    where = ""
+    params = []
+    if before is not None:
+        where = "WHERE (i.uploaded_at, i.id) < (?, ?)"
+        params = [before[0], before[1]]
+
+    return db.execute(f"""
+        SELECT {", ".join(columns)} 
         FROM images i 
-        JOIN users u ON i.user_id = u.id 
-        ORDER BY i.uploaded_at DESC
-    """).fetchall()
-    
-    return post_rows
+        {join} 
+        {where}
+        ORDER BY i.uploaded_at DESC, i.id DESC
+        LIMIT ?
+    """, (*params, limit)).fetchall()
+
+# the columns ownership checks need, without touching the image
+def get_post_meta(post_id):
+    db = get_db()
+    return db.execute("SELECT id, user_id, name, mime_type FROM images WHERE id = ?", (post_id,)).fetchone()
 
 def get_post_by_id(post_id,):
     db = get_db()
-    return db.execute("SELECT base64_image, name, user_id, mime_type FROM images WHERE id = ?", (post_id,)).fetchone()
+    return db.execute("SELECT image_hash, base64_image, name, user_id, mime_type FROM images WHERE id = ?", (post_id,)).fetchone()
+
+# returns the posts with the given ids in one query, in no particular order;
+# ids that do not exist are simply absent. `fields` works as in get_posts_page
+def get_posts_by_ids(post_ids, fields=None):
+    if not post_ids:
+        return []
 
-def update_post_image(post_id, image_blob, mime_type):
     db = get_db()
-    db.execute("UPDATE images SET base64_image = ?, mime_type = ?, updated_at = ? WHERE id = ?", (image_blob, mime_type, int(time.time()), post_id))
-    db.commit()
+    fields = POST_PAGE_COLUMNS if fields is None else fields
 
-def update_post_description(post_id, description):
+    columns = ["i.id", "i.uploaded_at"]
+    for field in fields:
+        columns.extend(POST_PAGE_COLUMNS.get(field, []))
+    join = "JOIN users u ON i.user_id = u.id" if "username" in fields else ""
+    placeholders = ", ".join("?" for _ in post_ids)
+
+    return db.execute(f"""
+        SELECT {", ".join(columns)} 
+        FROM images i 
+        {join} 
+        WHERE i.id IN ({placeholders})
+    """, tuple(post_ids)).fetchall()
+
+# everything serve_blob needs to answer a request except the image itself
+def get_image_meta(post_id):
+    db = get_db()
+    return db.execute("""
+        SELECT id, image_hash, mime_type, uploaded_at, updated_at, base64_image IS NOT NULL AS has_inline_image 
+        FROM images WHERE id = ?
+    """, (post_id,)).fetchone()
+
+def get_inline_image(post_id):
     db = get_db()
-    db.execute("UPDATE images SET description = ?, updated_at = ? WHERE id = ?", (description, int(time.time()), post_id))
-    db.commit()
+    row = db.execute("SELECT base64_image FROM images WHERE id = ?", (post_id,)).fetchone()
+    return row["base64_image"] if row else None
+
+# store_blob() as for add_post
+def update_post_image(post_id, store_blob, mime_type):
+    feed_cache = get_feed_cache()
+    image_hash = None
+
+    def write(db):
+        nonlocal image_hash
+        image_hash, image_size = store_blob()
+        old = db.execute("SELECT image_hash FROM images WHERE id = ?", (post_id,)).fetchone()
+        version = bump_data_version(db)
+        updated_at = int(time.time())
+        db.execute(
+            "UPDATE images SET image_hash = ?, image_size = ?, base64_image = NULL, mime_type = ?, updated_at = ?, change_version = ? WHERE id = ?",
+            (image_hash, image_size, mime_type, updated_at, version, post_id)
+        )
+        if old:
+            publish_event(db, "post_updated", post_id=post_id, fields=["image"], mime_type=mime_type, updated_at=updated_at)
+        return old, version
+
+    old, _ = run_write(write, after_commit=lambda result: feed_cache.note_write(result[1], post_ids=[post_id]))
+
+    if old and old["image_hash"] != image_hash:
+        schedule_derivatives(image_hash)
+        release_blob(old["image_hash"])
+
+def update_post_description(post_id, description):
+    feed_cache = get_feed_cache()
+
+    def write(db):
+        version = bump_data_version(db)
+        updated_at = int(time.time())
+        updated = db.execute(
+            "UPDATE images SET description = ?, updated_at = ?, change_version = ? WHERE id = ?",
+            (description, updated_at, version, post_id)
+        ).rowcount
+        if updated:
+            publish_event(db, "post_updated", post_id=post_id, fields=["description"], updated_at=updated_at)
+        return version
+
+    run_write(write, after_commit=lambda version: feed_cache.note_write(version, post_ids=[post_id]))
 
 # deletes post if post exists and user id matches
 def delete_post(post_id, user_id):
-    try:
-        db = get_db()
+    feed_cache = get_feed_cache()
+
+    def write(db):
+        row = db.execute("SELECT image_hash FROM images WHERE id = ? AND user_id = ?", (post_id, user_id)).fetchone()
+        if not row:
+            return None, None
+
+        version = bump_data_version(db)
         db.execute("DELETE FROM images WHERE id = ? AND user_id = ?", (post_id, user_id))
-        db.commit()
+        # tombstone for delta sync; replaces an older one if the id was reused
+        db.execute(
+            "INSERT OR REPLACE INTO deleted_posts (post_id, change_version, deleted_at) VALUES (?, ?, ?)",
+            (post_id, version, int(time.time()))
+        )
+        publish_event(db, "post_deleted", post_id=post_id)
+        return row, version
+
+    def after_commit(result):
+        row, version = result
+        if row:
+            feed_cache.note_write(version, post_ids=[post_id])
+
+    try:
+        row, _ = run_write(write, after_commit)
+        if row:
+            release_blob(row["image_hash"])
         return True
     except Exception as e:
-        print(f'[ERROR] Failed to delete post ID: {post_id} for user ID: {user_id}, error: {e}')
-        return False
\ No newline at end of file
+        logger.error('Failed to delete post ID: %s for user ID: %s, error: %s', post_id, user_id, e)
+        return False
+
+# removes a stored image once no post references it anymore
+def release_blob(image_hash):
+    if not image_hash:
+        return
+
+    # checked and unlinked inside a write: any post storing the same image
+    # does so in its own write (see add_post), so it either comes first and
+    # keeps the blob or comes after and stores it again
+    root = get_store_root()
+
+    def write(db):
+        if image_in_use(db, image_hash):
+            return
+        # its thumbnails go with it
+        for blob_hash in delete_derivatives(db, image_hash):
+            delete_blob(blob_hash, root)
+        delete_blob(image_hash, root)
+
+    run_write(write)
@@ -0,0 +1,78 @@
+import re
+from app.db.db import get_db, transaction
+from app.db.migrations import populate_search_index
+
+# column weights for bm25: description and username of the post, then the text of a comment
+POST_WEIGHTS = (3.0, 2.0)
+COMMENT_WEIGHT = 1.0
+
+def build_match_terms(text):
+    """Turn free text into one FTS5 query per word, the last one as a prefix"""
+    terms = re.findall(r"\w+", text)
+    if not terms:
+        return None
+
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return quoted
+
+# a post's words are spread over its own row and one row per comment, so each
+# term is looked up on its own and a post matches when every term hit one of them
+def term_hits_sql(term_count):
+    per_term = """
+        SELECT rowid AS post_id, {term} AS term, bm25(post_search, ?, ?) AS score, NULL AS comment_id
+        FROM post_search WHERE post_search MATCH ?
+        UNION ALL
+        SELECT post_id, {term}, bm25(comment_search, ?, 0) AS score, rowid
+        FROM comment_search WHERE comment_search MATCH ?
+    """
+    return " UNION ALL ".join(per_term.format(term=term) for term in range(term_count))
+
+def get_snippets(db, table, column, match_query, row_ids):
+    if not row_ids:
+        return {}
+    placeholders = ", ".join("?" for _ in row_ids)
+    return dict(db.execute(f"""
+        SELECT rowid, snippet({table}, {column}, '[', ']', '...', 12)
+        FROM {table} WHERE {table} MATCH ? AND rowid IN ({placeholders})
+    """, (match_query, *row_ids)).fetchall())
+
+# returns up to `limit` posts matching every term, best first, skipping the
+# first `offset`; each carries a snippet of its best-matching text
+def search_posts(terms, limit, offset=0):
+    db = get_db()
+    params = []
+    for term in terms:
+        params.extend((*POST_WEIGHTS, term, COMMENT_WEIGHT, term))
+
+    # bm25() only works where its table is matched, so the hits are
+    # materialized before grouping; min() makes comment_id that of the best one
+    rows = db.execute(f"""
+        WITH hits AS MATERIALIZED ({term_hits_sql(len(terms))}),
+        matches AS (
+            SELECT post_id, sum(score) AS score, min(score), comment_id
+            FROM hits
+            GROUP BY post_id
+            HAVING count(DISTINCT term) = ?
+        )
+        SELECT i.id, i.description, i.uploaded_at, i.mime_type, i.image_hash, u.username, matches.comment_id, matches.score
+        FROM matches
+        JOIN images i ON i.id = matches.post_id
+        LEFT JOIN users u ON i.user_id = u.id
+        ORDER BY matches.score, i.id
+        LIMIT ? OFFSET ?
+    """, (*params, len(terms), limit, offset)).fetchall()
+
+    any_term = " OR ".join(terms)
+    post_snippets = get_snippets(db, "post_search", -1, any_term, [row["id"] for row in rows if row["comment_id"] is None])
+    comment_snippets = get_snippets(db, "comment_search", 0, any_term, [row["comment_id"] for row in rows if row["comment_id"] is not None])
+
+    return [
+        dict(row, snippet=post_snippets.get(row["id"]) if row["comment_id"] is None else comment_snippets.get(row["comment_id"]))
+        for row in rows
+    ]
+
+def rebuild_search_index():
+    with transaction() as db:
+        populate_search_index(db)
+        return db.execute("SELECT count(*) FROM post_search").fetchone()[0]
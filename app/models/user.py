@@ -1,28 +1,52 @@
-from flask import g
-from app.db.db import get_db
+from flask import g, current_app
+from app.db.db import get_db, run_write, bump_data_version
+from app.cache.feed import get_feed_cache
+from app.cache.lru import LRUCache
+
+# auth0_sub -> users.id for this process, so most requests skip the users table
+user_id_cache = None
+
+def get_user_id_cache():
+    global user_id_cache
+    if user_id_cache is None:
+        user_id_cache = LRUCache(current_app.config['USER_CACHE_SIZE'], name="user_ids")
+    return user_id_cache
 
 def get_or_create_user(auth0_sub):
-    db = get_db()
-    
-    user = db.execute("SELECT id, username FROM users WHERE auth0_sub = ?", (auth0_sub,)).fetchone()
-    
-    if user is None:
-        # Get email from token claims
-        email = g.user_claims.get('email', f'user_{auth0_sub[:8]}')
-        print(f'[INFO] Creating new user with email: {email}')
-        
-        db.execute("INSERT INTO users (auth0_sub, username) VALUES (?, ?)", (auth0_sub, email))
-        db.commit()
-        
-        user = db.execute("SELECT id, username FROM users WHERE auth0_sub = ?", (auth0_sub,)).fetchone()
-        print(f'[INFO] Created user - ID: {user["id"]}, Username: {user["username"]}')
-    else:
-        print(f'[INFO] Found existing user - ID: {user["id"]}, Username: {user["username"]}')
-    
-    email = g.user_claims.get('email')
-    print(f'[INFO] User email: {email}')
-    
-    return user["id"]
+    cache = get_user_id_cache()
+    user_id = cache.get(auth0_sub)
+    if user_id is not None:
+        return user_id
+
+    # users who already exist (most cache misses: a new worker, an evicted entry)
+    # are read without taking the writer
+    row = get_db().execute("SELECT id FROM users WHERE auth0_sub = ?", (auth0_sub,)).fetchone()
+    if row is not None:
+        cache.set(auth0_sub, row["id"])
+        return row["id"]
+
+    # Get email from token claims
+    email = g.user_claims.get('email', f'user_{auth0_sub[:8]}')
+
+    # insert-or-fetch in one statement, since another request may create the user first;
+    # the no-op update makes RETURNING yield the existing row
+    def write(db):
+        return db.execute("""
+            INSERT INTO users (auth0_sub, username) VALUES (?, ?)
+            ON CONFLICT(auth0_sub) DO UPDATE SET auth0_sub = excluded.auth0_sub
+            RETURNING id
+        """, (auth0_sub, email)).fetchone()["id"]
+
+    user_id = run_write(write)
+    cache.set(auth0_sub, user_id)
+    return user_id
+
+# drops cached sub -> id entries for a user whose row changed or was removed
+def forget_user(user_id):
+    cache = get_user_id_cache()
+    for auth0_sub, cached_id in cache.items():
+        if cached_id == user_id:
+            cache.pop(auth0_sub)
 
 def get_user_by_id(user_id):
     db = get_db()
@@ -30,14 +54,29 @@ def get_user_by_id(user_id):
 
 # updates username for given user id
 def update_username(user_id, new_username):
-    db = get_db()
-    
-    # check if username exists
-    existing = db.execute("SELECT id FROM users WHERE username = ? AND id != ?", (new_username, user_id)).fetchone()
-    
-    if existing:
-        return False
+    feed_cache = get_feed_cache()
+
+    def write(db):
+        # check if username exists
+        existing = db.execute("SELECT id FROM users WHERE username = ? AND id != ?", (new_username, user_id)).fetchone()
         
-    db.execute("UPDATE users SET username = ? WHERE id = ?", (new_username, user_id))
-    db.commit()
-    return True
\ No newline at end of file
+        if existing:
+            return None
+            
+        db.execute("UPDATE users SET username = ? WHERE id = ?", (new_username, user_id))
+        # the username is part of every post and comment by the user, so delta sync resends them
+        version = bump_data_version(db)
+        db.execute("UPDATE images SET change_version = ? WHERE user_id = ?", (version, user_id))
+        db.execute("UPDATE comments SET change_version = ? WHERE user_id = ?", (version, user_id))
+        return version
+
+    def after_commit(version):
+        # the user's name appears on their posts and comments anywhere in the feed
+        if version is not None:
+            feed_cache.note_write(version, everything=True)
+
+    if run_write(write, after_commit) is None:
+        return False
+
+    forget_user(user_id)
+    return True
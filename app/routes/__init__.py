@@ -5,8 +5,14 @@ def register_routes(app):
     from app.routes.posts import bp as posts_bp
     from app.routes.comments import bp as comments_bp
     from app.routes.users import bp as users_bp
+    from app.routes.search import bp as search_bp
+    from app.routes.metrics import bp as metrics_bp
+    from app.routes.events import bp as events_bp
     
     app.register_blueprint(health_bp, url_prefix='/api')
     app.register_blueprint(posts_bp, url_prefix='/api')
     app.register_blueprint(comments_bp, url_prefix='/api')
-    app.register_blueprint(users_bp, url_prefix='/api')
\ No newline at end of file
+    app.register_blueprint(users_bp, url_prefix='/api')
+    app.register_blueprint(search_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp, url_prefix='/api')
+    app.register_blueprint(events_bp, url_prefix='/api')
\ No newline at end of file
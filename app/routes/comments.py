@@ -1,8 +1,9 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask import g
 from app.middleware.auth import require_auth
 from app.models.user import get_or_create_user
-from app.models.comment import create_comment
+from app.models.comment import create_comment, create_comments, get_comments_for_post
+from app.utils.cursor import encode_cursor, parse_page_args
 
 bp = Blueprint('comments', __name__)
 
@@ -12,6 +13,60 @@ def add_comment():
     user_id = get_or_create_user(g.user_claims['sub'])
     
     data = request.json
-    create_comment(data['post_id'], user_id, data['text'])
+    if create_comment(data['post_id'], user_id, data['text']) is None:
+        return jsonify({"error": "Post not found"}), 404
     
-    return jsonify({"message": "Comment added"}), 201
\ No newline at end of file
+    return jsonify({"message": "Comment added"}), 201
+
+# adds many comments with one auth check, user lookup and commit; each item
+# gets its own status so one bad item does not fail the rest
+@bp.route('/comments/batch', methods=['POST'])
+@require_auth
+def add_comments():
+    data = request.get_json(silent=True) or {}
+    items = data.get('comments')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "comments must be a non-empty list"}), 400
+
+    max_items = current_app.config['COMMENTS_BATCH_MAX']
+    if len(items) > max_items:
+        return jsonify({"error": f"At most {max_items} comments per batch"}), 400
+
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        post_id = item.get('post_id') if isinstance(item, dict) else None
+        text = item.get('text') if isinstance(item, dict) else None
+        if not isinstance(post_id, int) or isinstance(post_id, bool) or not isinstance(text, str) or not text.strip():
+            results[index] = {"status": 400, "error": "Each comment needs an integer post_id and non-empty text"}
+        else:
+            valid.append((index, post_id, text))
+
+    user_id = get_or_create_user(g.user_claims['sub'])
+    comment_ids = create_comments(user_id, [(post_id, text) for _, post_id, text in valid])
+    for (index, _, _), comment_id in zip(valid, comment_ids):
+        if comment_id is None:
+            results[index] = {"status": 404, "error": "Post not found"}
+        else:
+            results[index] = {"status": 201, "id": comment_id}
+
+    return jsonify({"results": results}), 200
+
+# pages through the comments of one post, continuing from a feed entry's comments_cursor
+@bp.route('/posts/<int:post_id>/comments', methods=['GET'])
+def list_comments(post_id):
+    try:
+        limit, after = parse_page_args(current_app.config['COMMENTS_PAGE_SIZE'], current_app.config['COMMENTS_MAX_PAGE_SIZE'])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    comments = get_comments_for_post(post_id, limit + 1, after)
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = encode_cursor(comments[-1]["created_at"], comments[-1]["id"])
+
+    return jsonify({
+        "comments": [{"text": c["comment_text"], "author": c["username"]} for c in comments],
+        "next_cursor": next_cursor
+    }), 200
@@ -0,0 +1,97 @@
+import queue
+import time
+from flask import Blueprint, request, jsonify, Response, current_app, url_for
+from app.events import StreamLimitReached, get_broadcaster
+from app.middleware.ratelimit import REJECTED
+
+bp = Blueprint('events', __name__)
+
+# how long an EventSource waits before reconnecting after the stream ends
+RECONNECT_MS = 3000
+
+def parse_last_event_id():
+    """The id to resume after, from the Last-Event-ID header or ?last_event_id=; None for new streams"""
+    raw = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if not raw:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        raise ValueError("Last-Event-ID must be an integer")
+
+def generate_events(broadcaster, subscription, last_id, heartbeat, max_seconds):
+    yield f"retry: {RECONNECT_MS}\n\n"
+
+    oldest, newest = broadcaster.bounds()
+    if last_id is None or last_id > newest:
+        last_id = newest
+    elif oldest is not None and last_id < oldest - 1:
+        # events this client missed have been pruned; it has to reload the feed
+        yield "event: reset\ndata: {}\n\n"
+        last_id = newest
+
+    # catch up from the log first, then follow the poller; anything delivered
+    # both ways is skipped by id
+    subscription.overflowed = True
+    deadline = time.monotonic() + max_seconds
+    while True:
+        if subscription.overflowed:
+            subscription.overflowed = False
+            for event_id, message in broadcaster.replay(last_id):
+                yield message
+                last_id = event_id
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            # ending the stream lets the client reconnect with Last-Event-ID and frees the thread
+            return
+        try:
+            event_id, message = subscription.events.get(timeout=min(heartbeat, remaining))
+        except queue.Empty:
+            # a comment line keeps proxies from timing out the connection and
+            # surfaces a disconnected client as a failed write
+            yield ": heartbeat\n\n"
+            continue
+        if event_id > last_id:
+            yield message
+            last_id = event_id
+
+def poll_instead(message):
+    """503 for a stream over the limit, telling the client to poll the feed for a while.
+
+    EventSource gives up on a 503, so clients switch to conditional GETs of the
+    feed (304 until something changes) and try the stream again after Retry-After.
+    """
+    interval = current_app.config['EVENTS_FALLBACK_POLL_SECONDS']
+    response = jsonify({"error": message, "poll": url_for('posts.list_posts'), "poll_interval": interval})
+    response.headers['Retry-After'] = str(interval)
+    return response, 503
+
+# Server-Sent Events for new and changed posts and comments, carrying ids and
+# metadata only; clients fetch what they need with /posts/batch. Streams are
+# capped per worker (EVENTS_MAX_STREAMS); beyond that clients poll
+@bp.route('/posts/stream', methods=['GET'])
+def stream_events():
+    try:
+        last_id = parse_last_event_id()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    broadcaster = get_broadcaster()
+    try:
+        subscription = broadcaster.subscribe()
+    except StreamLimitReached as e:
+        REJECTED.labels("stream_limit").inc()
+        return poll_instead(str(e))
+
+    config = current_app.config
+    events = generate_events(broadcaster, subscription, last_id, config['EVENTS_HEARTBEAT_SECONDS'], config['EVENTS_STREAM_MAX_SECONDS'])
+
+    # not wrapped in stream_with_context: the request is done (and its
+    # in-flight slot released) once the stream starts
+    response = Response(events, mimetype='text/event-stream')
+    response.call_on_close(lambda: broadcaster.unsubscribe(subscription))
+    response.cache_control.no_cache = True
+    # stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
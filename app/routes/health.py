@@ -1,13 +1,38 @@
-from flask import Blueprint, jsonify
+import logging
+import os
+from flask import Blueprint, jsonify, current_app
 from app.middleware.auth import require_auth
+from app.middleware.ratelimit import exempt
+from app.db.db import get_db
+from app.db.migrations import LATEST_VERSION, get_schema_version
 from flask import g
 
 bp = Blueprint('health', __name__)
+logger = logging.getLogger(__name__)
 
 @bp.route('/health', methods=['GET'])
+@exempt
 def health():
     return jsonify({"status": "ok", "message": "Server is running"})
 
+# readiness, unlike /health (the process is up): this worker can serve real
+# traffic, with the schema migrated and the blob store writable
+@bp.route('/ready', methods=['GET'])
+@exempt
+def ready():
+    checks = {}
+    try:
+        version = get_schema_version(get_db())
+        checks["database"] = "ok" if version == LATEST_VERSION else f"schema version {version}, expected {LATEST_VERSION}"
+    except Exception as e:
+        checks["database"] = f"error: {e}"
+
+    root = current_app.config['BLOB_STORE_PATH']
+    checks["blob_store"] = "ok" if os.path.isdir(root) and os.access(root, os.W_OK) else "not writable"
+
+    is_ready = all(result == "ok" for result in checks.values())
+    return jsonify({"status": "ready" if is_ready else "not ready", "checks": checks}), 200 if is_ready else 503
+
 @bp.route('/foobar', methods=['GET'])
 @require_auth
 def foobar():
@@ -22,7 +47,5 @@ def foobar():
             }
         })
     except Exception as e:
-        print(f"[ERROR] In foobar endpoint: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in foobar endpoint")
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
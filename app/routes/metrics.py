@@ -0,0 +1,15 @@
+from flask import Blueprint, Response, current_app
+from app.metrics.multiprocess import render_all
+from app.metrics.registry import CONTENT_TYPE, render_metrics
+from app.middleware.ratelimit import exempt
+
+bp = Blueprint('metrics', __name__)
+
+# Prometheus scrape target; with METRICS_DIR set the values are summed over all
+# workers (see app.metrics.multiprocess), otherwise they are this process's only
+@bp.route('/metrics', methods=['GET'])
+@exempt
+def metrics():
+    directory = current_app.config['METRICS_DIR']
+    body = render_all(directory) if directory else render_metrics()
+    return Response(body, content_type=CONTENT_TYPE)
@@ -1,38 +1,300 @@
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify, Response, current_app, send_file, stream_with_context, url_for
 from flask import g
 from app.middleware.auth import require_auth
 from app.models.user import get_or_create_user
-from app.models.post import add_post, get_all_posts, get_post_by_id, update_post_description, update_post_image, delete_post
-from app.models.comment import get_comments_for_post
+from app.models.post import add_post, get_posts_page, get_posts_by_ids, get_post_meta, get_image_meta, get_inline_image, update_post_description, update_post_image, delete_post
+from app.models.comment import get_comments_for_posts
+from app.models.changes import get_changes
+from app.models.derivative import get_derivative
+from app.storage.blobs import get_store_root, put_blob, open_blob, blob_path
+from app.storage.derivatives import DERIVATIVE_SIZES, schedule_derivatives
+from app.utils.images import DERIVATIVE_MIME_TYPE
+from app.cache.feed import get_feed_cache
+from app.db.db import get_data_version
+from app.utils.cursor import encode_cursor, decode_cursor, parse_limit, parse_page_args
+from app.utils.compression import negotiate_encoding
+from app.utils.uploads import is_upload_request, read_upload
+from werkzeug.http import is_resource_modified
+from datetime import datetime, timezone
 import base64
+import binascii
+import hashlib
+import logging
+import time
 
 bp = Blueprint('posts', __name__)
+logger = logging.getLogger(__name__)
+
+# bytes of image read per base64 chunk; a multiple of 3 so chunks encode without padding
+IMAGE_CHUNK_SIZE = 3 * 16 * 1024
+
+# base64 text for a post's image in chunks, read from the blob store (or from
+# legacy rows that still carry the image inline)
+def iter_inline_image(post):
+    if post["image_hash"]:
+        with open_blob(post["image_hash"]) as f:
+            while True:
+                chunk = f.read(IMAGE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield base64.b64encode(chunk).decode('ascii')
+    elif post["has_inline_image"]:
+        yield get_inline_image(post["id"])
+
+# fields a feed entry can carry, in output order; clients pick a subset with ?fields=
+FEED_FIELDS = ("id", "description", "username", "uploaded_at", "comments", "comment_count", "mime_type", "image")
+
+def parse_feed_fields():
+    """Read ?fields= and ?image= from the query string, returning (fields, image_mode) or raising ValueError"""
+    fields = FEED_FIELDS
+    raw_fields = request.args.get('fields')
+    if raw_fields:
+        requested = {field.strip() for field in raw_fields.split(',') if field.strip()}
+        unknown = requested.difference(FEED_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        # id is always included so entries can be told apart
+        fields = tuple(field for field in FEED_FIELDS if field in requested or field == "id")
+
+    image_mode = request.args.get('image', 'inline')
+    if image_mode not in ('inline', 'url'):
+        raise ValueError("image must be 'inline' or 'url'")
+
+    return fields, image_mode
+
+def page_columns(fields, image_mode):
+    """POST_PAGE_COLUMNS keys to select for fields; image URLs only need the hash that versions them"""
+    return [("image_url" if field == "image" and image_mode == 'url' else field) for field in fields]
+
+def image_url(post_id, image_hash):
+    """URL of a post's image, versioned by its content hash so it can be cached for good"""
+    return url_for('posts.serve_blob', post_id=post_id, v=image_hash)
+
+def generate_feed(posts, comments_by_post, next_cursor, fields=FEED_FIELDS, image_mode='inline'):
+    """Yield the feed JSON one post at a time so only one image is in memory at once"""
+    yield '{"posts":['
+    yield from generate_entries(posts, comments_by_post, fields, image_mode)
+    yield '],"next_cursor":' + current_app.json.dumps(next_cursor) + '}'
+
+def generate_entries(posts, comments_by_post, fields=FEED_FIELDS, image_mode='inline'):
+    """Yield the comma separated JSON entries for posts, as they appear in the feed"""
+    dumps = current_app.json.dumps
+    inline = "image" in fields and image_mode == 'inline'
+
+    for index, post in enumerate(posts):
+        comments, comment_count = comments_by_post.get(post["id"], ([], 0))
+
+        entry = {}
+        for field in fields:
+            if field == "comments":
+                entry["comments"] = [{"text": c["comment_text"], "author": c["username"]} for c in comments]
+                entry["comments_cursor"] = None
+                if comments and comment_count > len(comments):
+                    entry["comments_cursor"] = encode_cursor(comments[-1]["created_at"], comments[-1]["id"])
+            elif field == "comment_count":
+                entry["comment_count"] = comment_count
+            elif field == "image":
+                if image_mode == 'url':
+                    entry["image_url"] = image_url(post["id"], post["image_hash"])
+            else:
+                entry[field] = post[field]
+
+        entry = dumps(entry)
+        if not inline:
+            yield ("," if index else "") + entry
+            continue
+
+        # splice the image in as the last key, streamed in base64 chunks
+        yield ("," if index else "") + entry[:-1] + ',"base64_image":"'
+        yield from iter_inline_image(post)
+        yield '"}'
+
+def cache_feed(chunks, cache_key, version, post_ids, first_page):
+    """Pass feed chunks through, storing the complete body in the feed cache if it fits"""
+    feed_cache = get_feed_cache()
+    parts = []
+    size = 0
+
+    for chunk in chunks:
+        if parts is not None:
+            size += len(chunk)
+            if size <= feed_cache.max_entry_bytes:
+                parts.append(chunk)
+            else:
+                # too big to cache; stop buffering but keep streaming
+                parts = None
+        yield chunk
+
+    if parts is not None:
+        feed_cache.put(cache_key, version, "".join(parts).encode('utf-8'), post_ids, first_page)
+
+def decode_image(base64_image):
+    """Decode an uploaded base64 image, raising ValueError if it is not valid base64"""
+    try:
+        image_bytes = base64.b64decode(base64_image)
+    except (binascii.Error, TypeError) as e:
+        raise ValueError("Image is not valid base64") from e
+
+    if not image_bytes:
+        raise ValueError("Image is empty")
+    return image_bytes
+
+def feed_etag(version, cache_key):
+    """Weak ETag for a feed page: the data version plus the normalized query (page, fields, image mode).
+
+    Weak because the same page is served plain or compressed.
+    """
+    query = hashlib.sha1(repr(cache_key).encode('utf-8')).hexdigest()[:16]
+    return f"feed-{version}-{query}"
+
+def feed_response(response, etag):
+    response.set_etag(etag, weak=True)
+    # clients may keep the page but must revalidate it, which is cheap
+    response.cache_control.no_cache = True
+    return response
 
 @bp.route('/posts', methods=['GET'])
 def list_posts():
-    # GET: Retrieve all posts and comments
-    posts = get_all_posts()
-    results = []
-    
-    for post in posts:
-        comments = get_comments_for_post(post["id"])
-        results.append({
-            "id": post["id"],
-            "description": post["description"],
-            "username": post["username"],
-            "uploaded_at": post["uploaded_at"],
-            "comments": [{"text": c["comment_text"], "author": c["username"]} for c in comments],
-            "mime_type": post["mime_type"],
-            "base64_image": post["base64_image"]
-        })
-    
-    return jsonify(results), 200
+    # GET: Retrieve one page of posts and their comments
+    try:
+        limit, before = parse_page_args(current_app.config['FEED_PAGE_SIZE'], current_app.config['FEED_MAX_PAGE_SIZE'])
+        fields, image_mode = parse_feed_fields()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # read the version before any data so a cached page is never newer than its tag
+    cache_key = (limit, before, fields, image_mode)
+    version = get_data_version()
+
+    # an unchanged feed is answered from the version alone, without reading posts or comments
+    etag = feed_etag(version, cache_key)
+    if request.if_none_match.contains_weak(etag):
+        return feed_response(Response(status=304, mimetype='application/json'), etag)
+
+    cached = get_feed_cache().get(cache_key, version, negotiate_encoding())
+    if cached is not None:
+        body, encoding = cached
+        response = Response(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return feed_response(response, etag), 200
+
+    # fetch one extra row to learn whether another page exists
+    posts = get_posts_page(limit + 1, before, page_columns(fields, image_mode))
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        last = posts[-1]
+        next_cursor = encode_cursor(last["uploaded_at"], last["id"])
+
+    # two queries for the first few comments of every post on the page
+    comments_by_post = {}
+    if "comments" in fields or "comment_count" in fields:
+        per_post = current_app.config['FEED_COMMENTS_PER_POST']
+        comments_by_post = get_comments_for_posts([post["id"] for post in posts], per_post)
+
+    # the body is sent chunked while it is generated
+    feed = generate_feed(posts, comments_by_post, next_cursor, fields, image_mode)
+    feed = cache_feed(feed, cache_key, version, [post["id"] for post in posts], first_page=before is None)
+    return feed_response(Response(stream_with_context(feed), mimetype='application/json'), etag), 200
+
+def parse_post_ids():
+    """Read ?ids=1,2,3 into a list of unique ids in request order, raising ValueError"""
+    raw = request.args.get('ids', '')
+    try:
+        ids = [int(value) for value in raw.split(',') if value.strip()]
+    except ValueError:
+        raise ValueError("ids must be a comma separated list of integers")
+    if not ids:
+        raise ValueError("ids is required")
+
+    ids = list(dict.fromkeys(ids))
+    max_ids = current_app.config['POST_BATCH_MAX_IDS']
+    if len(ids) > max_ids:
+        raise ValueError(f"At most {max_ids} ids per request")
+    return ids
+
+# several posts by id in one query, shaped like feed entries (same ?fields= and
+# ?image= options); ids that do not exist are listed under "missing"
+@bp.route('/posts/batch', methods=['GET'])
+def get_posts_batch():
+    try:
+        post_ids = parse_post_ids()
+        fields, image_mode = parse_feed_fields()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    found = {post["id"]: post for post in get_posts_by_ids(post_ids, page_columns(fields, image_mode))}
+    posts = [found[post_id] for post_id in post_ids if post_id in found]
+    missing = [post_id for post_id in post_ids if post_id not in found]
+
+    comments_by_post = {}
+    if "comments" in fields or "comment_count" in fields:
+        per_post = current_app.config['FEED_COMMENTS_PER_POST']
+        comments_by_post = get_comments_for_posts([post["id"] for post in posts], per_post)
+
+    def generate():
+        yield '{"posts":['
+        yield from generate_entries(posts, comments_by_post, fields, image_mode)
+        yield '],"missing":' + current_app.json.dumps(missing) + '}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json'), 200
+
+def parse_sync_token():
+    """Read ?since= (a token from an earlier /posts/changes response), returning None when absent or raising ValueError"""
+    token = request.args.get('since')
+    if not token:
+        return None
+    try:
+        (version,) = decode_cursor(token, 1)
+    except ValueError:
+        raise ValueError("Invalid sync token")
+    if not isinstance(version, int) or version < 0:
+        raise ValueError("Invalid sync token")
+    return version
+
+# posts and comments created, updated or deleted after a sync token, for
+# clients that keep a local copy of the feed; without ?since= everything is
+# sent. Apply "deleted" before "posts", since a deleted id can be reused.
+# Keep calling with next_since while has_more is true
+@bp.route('/posts/changes', methods=['GET'])
+def get_post_changes():
+    config = current_app.config
+    try:
+        since = parse_sync_token()
+        limit = parse_limit(config['SYNC_PAGE_SIZE'], config['SYNC_MAX_PAGE_SIZE'])
+        fields, image_mode = parse_feed_fields()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # changed comments are listed on their own rather than under each post
+    fields = tuple(field for field in fields if field not in ("comments", "comment_count")) + ("updated_at",)
+    version, until, has_more, posts, comments, deleted = get_changes(since, limit, page_columns(fields, image_mode))
+    if since is not None and since > version:
+        return jsonify({"error": "Sync token is ahead of this server's data; sync again without since"}), 410
+
+    def generate():
+        dumps = current_app.json.dumps
+        yield '{"deleted":' + dumps(deleted) + ',"posts":['
+        yield from generate_entries(posts, {}, fields, image_mode)
+        yield '],"comments":' + dumps([
+            {"id": c["id"], "post_id": c["image_id"], "text": c["comment_text"], "author": c["username"], "created_at": c["created_at"]}
+            for c in comments
+        ])
+        yield ',"next_since":' + dumps(encode_cursor(until)) + ',"has_more":' + dumps(has_more) + '}'
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    response.cache_control.no_cache = True
+    return response, 200
 
 # TO DO: Image validation?
 @bp.route('/posts', methods=['POST'])
 @require_auth
 def create_post():
     user_id = get_or_create_user(g.user_claims['sub'])
+    if is_upload_request():
+        return create_post_from_upload(user_id)
+
     data = request.json
     
     base64_image = data.get('image')
@@ -47,34 +309,83 @@ def create_post():
     if len(filename) > 255:
         return jsonify({"error": "Filename too long"}), 400
     
-    print(f'[INFO] Creating post for user ID: {user_id} with filename: {filename} and description: "{description}"', flush=True)
+    try:
+        image_bytes = decode_image(base64_image)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    logger.info('Creating post for user ID: %s with filename: %s', user_id, filename)
     
-    # Store the base64 string directly in the database
-    add_post(user_id, filename, description, base64_image, mime_type)
+    # Store the raw bytes in the blob store and keep only the digest in the database;
+    # written here, outside the write, and only written again there if it was removed meanwhile.
+    # The root is read here because the write may run on the writer thread, outside the app context
+    root = get_store_root()
+    put_blob(image_bytes, root)
+    add_post(user_id, filename, description, lambda: put_blob(image_bytes, root), mime_type)
     
     return jsonify({"message": "Post created successfully"}), 201
 
+def create_post_from_upload(user_id):
+    """POST /posts with a multipart or raw image body, streamed into the blob store"""
+    try:
+        fields, upload = read_upload()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        description = fields.get("description", "").strip()
+        if upload is None or not description:
+            return jsonify({"error": "Missing image or description"}), 400
+
+        filename = fields.get("filename") or upload.filename or "image.jpg"
+        if len(filename) > 255:
+            return jsonify({"error": "Filename too long"}), 400
+
+        logger.info('Creating post for user ID: %s with filename: %s', user_id, filename)
+
+        # the mime type comes from the file's magic bytes, not from the client;
+        # committing the upload just moves its file into place
+        try:
+            add_post(user_id, filename, description, upload.commit, upload.mime_type)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    finally:
+        if upload is not None:
+            upload.abort()
+
+    return jsonify({"message": "Post created successfully"}), 201
+
 @bp.route('/posts/<int:post_id>', methods=['PATCH'])
 @require_auth
 def update_post(post_id):
     user_id = get_or_create_user(g.user_claims['sub'])
-    data = request.json
 
-    # Check if post exists and belongs to user
-    post = get_post_by_id(post_id)
+    # Check if post exists and belongs to user (before any of the body is read)
+    post = get_post_meta(post_id)
     if not post:
         return jsonify({"error": "Post not found"}), 404
     
     if post["user_id"] != user_id:
         return jsonify({"error": "Unauthorized"}), 403
-    
+
+    if is_upload_request():
+        return update_post_from_upload(post_id)
+
+    data = request.json
     updated_fields = []
 
     # Update post image if new image data is provided
     if data.get("image"):        
         mime_type = data.get('mime_type', "image/jpeg")
 
-        update_post_image(post_id, data["image"], mime_type)
+        try:
+            image_bytes = decode_image(data["image"])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        root = get_store_root()
+        put_blob(image_bytes, root)
+        update_post_image(post_id, lambda: put_blob(image_bytes, root), mime_type)
         updated_fields.append("image")
 
     # Update post description if provided
@@ -91,13 +402,114 @@ def update_post(post_id):
 
     return jsonify({"message": "Post updated successfully", "updated_fields": updated_fields}), 200
 
+def update_post_from_upload(post_id):
+    """PATCH /posts/<id> with a multipart or raw image body"""
+    try:
+        fields, upload = read_upload()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        new_description = fields.get("description")
+        if new_description is not None:
+            new_description = new_description.strip()
+            if not new_description:
+                return jsonify({"error": "Description cannot be empty"}), 400
+
+        if upload is None and new_description is None:
+            return jsonify({"error": "No valid fields to update"}), 400
+
+        updated_fields = []
+        if upload is not None:
+            try:
+                update_post_image(post_id, upload.commit, upload.mime_type)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            updated_fields.append("image")
+
+        if new_description is not None:
+            update_post_description(post_id, new_description)
+            updated_fields.append("description")
+    finally:
+        if upload is not None:
+            upload.abort()
+
+    return jsonify({"message": "Post updated successfully", "updated_fields": updated_fields}), 200
+
+# seconds a derivative may stay pending before a request schedules it again,
+# e.g. after the worker process that was rendering it exited
+DERIVATIVE_RETRY_SECONDS = 300
+
+def find_derivative(image_hash, size):
+    """Blob hash of a rendered derivative, or None; schedules a missing or stalled one"""
+    derivative = get_derivative(image_hash, size)
+    if derivative is None or (derivative["status"] == 'pending' and derivative["updated_at"] < time.time() - DERIVATIVE_RETRY_SECONDS):
+        schedule_derivatives(image_hash)
+
+    # a forced re-render keeps serving the previous copy until it finishes
+    return derivative["blob_hash"] if derivative is not None else None
+
+# ?size=thumb|medium serves a resized WebP copy once it has been rendered and
+# the original until then
 @bp.route('/images/download/<int:post_id>')
 def serve_blob(post_id):
-    row = get_post_by_id(post_id)
-    if not row:
+    size = request.args.get('size')
+    if size is not None and size not in DERIVATIVE_SIZES:
+        return jsonify({"error": f"size must be one of: {', '.join(DERIVATIVE_SIZES)}"}), 400
+
+    meta = get_image_meta(post_id)
+    if not meta or not (meta["image_hash"] or meta["has_inline_image"]):
         return "Not Found", 404
-    
-    return Response(base64.b64decode(row["base64_image"]), mimetype=row["mime_type"])
+
+    image_hash, mime_type = meta["image_hash"], meta["mime_type"]
+    if size is not None:
+        derivative_hash = find_derivative(image_hash, size) if image_hash else None
+        if derivative_hash:
+            image_hash, mime_type = derivative_hash, DERIVATIVE_MIME_TYPE
+
+    # a URL carrying the current content hash (?v=, as the feed links it) always
+    # serves the same bytes and may be cached for good; any other is revalidated,
+    # since the post's image can be replaced or deleted. So are derivatives: v is
+    # the original's hash, and a forced re-render changes the bytes under it
+    versioned = meta["image_hash"] is not None and request.args.get('v') == meta["image_hash"] and size is None
+
+    # blobs are validated by their content hash; legacy inline rows by their last write
+    changed_at = meta["updated_at"] or meta["uploaded_at"]
+    etag = image_hash or f'inline-{meta["id"]}-{changed_at}'
+    last_modified = datetime.fromtimestamp(changed_at, tz=timezone.utc) if changed_at else None
+    max_age = current_app.config['IMAGE_CACHE_MAX_AGE']
+
+    # revalidation is answered from the row alone, without opening the image
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    elif image_hash:
+        # send_file handles Range/If-Range (206) and uses sendfile where the server supports it
+        response = send_file(
+            blob_path(image_hash), mimetype=mime_type,
+            conditional=True, etag=etag, last_modified=last_modified
+        )
+        # the blob file name is just the hash; don't advertise it as a download name
+        del response.headers['Content-Disposition']
+    else:
+        # legacy row that has not been moved out of the database yet
+        response = Response(base64.b64decode(get_inline_image(post_id)), mimetype=mime_type)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.make_conditional(request, accept_ranges=True, complete_length=response.content_length)
+
+    if response.status_code == 304:
+        response.set_etag(etag)
+        response.last_modified = last_modified
+    response.cache_control.public = True
+    if versioned:
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    else:
+        # revalidated by ETag; for ?size= this also lets clients switch from the
+        # original to the derivative once it is ready
+        response.cache_control.no_cache = True
+    return response
 
 # route to remove a post
 @bp.route('/posts/<int:post_id>', methods=['DELETE'])
@@ -105,7 +517,7 @@ def serve_blob(post_id):
 def remove_post(post_id):
     # obtains user id from auth token
     user_id = get_or_create_user(g.user_claims['sub'])
-    post = get_post_by_id(post_id)
+    post = get_post_meta(post_id)
 
     if not post:
         return jsonify({"error": "Post not found"}), 404
@@ -0,0 +1,41 @@
+from flask import Blueprint, request, jsonify, current_app
+from app.models.search import build_match_terms, search_posts
+from app.routes.posts import image_url
+from app.utils.cursor import encode_cursor, parse_page_args
+
+bp = Blueprint('search', __name__)
+
+@bp.route('/search', methods=['GET'])
+def search():
+    terms = build_match_terms(request.args.get('q', ''))
+    if not terms:
+        return jsonify({"error": "Search query is required"}), 400
+
+    try:
+        limit, after = parse_page_args(current_app.config['SEARCH_PAGE_SIZE'], current_app.config['SEARCH_MAX_PAGE_SIZE'], arity=1)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # results are ranked, so the cursor carries an offset rather than a key
+    offset = after[0] if after else 0
+    if offset < 0:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    rows = search_posts(terms, limit + 1, offset)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(offset + limit)
+
+    return jsonify({
+        "results": [{
+            "id": row["id"],
+            "description": row["description"],
+            "username": row["username"],
+            "uploaded_at": row["uploaded_at"],
+            "mime_type": row["mime_type"],
+            "snippet": row["snippet"],
+            "image_url": image_url(row["id"], row["image_hash"])
+        } for row in rows],
+        "next_cursor": next_cursor
+    }), 200
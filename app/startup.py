@@ -0,0 +1,28 @@
+import logging
+import os
+from app.db.db import init_db, close_pools
+from app.middleware.auth import warm_keys
+
+logger = logging.getLogger(__name__)
+
+def prepare_for_serving(app):
+    """One-time startup work for a prefork server's master, before any worker exists.
+
+    Migrates the database once rather than in every worker and fills the
+    caches workers inherit on fork: the auth discovery document and JWKS,
+    and the first feed page. Connections opened here are closed again so no
+    SQLite handle is shared across the fork.
+    """
+    with app.app_context():
+        version = init_db()
+    logger.info("Database schema at version %s", version)
+
+    os.makedirs(app.config['BLOB_STORE_PATH'], exist_ok=True)
+    warm_keys()
+
+    response = app.test_client().get('/api/posts')
+    response.close()
+    if response.status_code != 200:
+        logger.warning("Feed warm-up returned %s", response.status_code)
+
+    close_pools()
@@ -0,0 +1,94 @@
+import hashlib
+import os
+import tempfile
+from flask import current_app
+
+# Content-addressed image store: each blob lives at <root>/ab/cd/<sha256 hex>,
+# so identical uploads share one file and the database keeps only the digest.
+
+def get_store_root():
+    return current_app.config['BLOB_STORE_PATH']
+
+def blob_path(digest, root=None):
+    """Absolute path of the file holding the blob with the given digest"""
+    root = root or get_store_root()
+    return os.path.abspath(os.path.join(root, digest[:2], digest[2:4], digest))
+
+def put_blob(data, root=None):
+    """Store raw bytes and return (sha256 hex digest, size in bytes)"""
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest, root)
+
+    if not os.path.exists(path):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        # write to a temp file first so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    return digest, len(data)
+
+class BlobWriter:
+    """Write a blob incrementally, hashing it as the bytes arrive.
+
+    Data goes to a temp file under the store root; commit() moves it to its
+    content address and abort() throws it away.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or get_store_root()
+        os.makedirs(self.root, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        self._file = os.fdopen(fd, 'wb')
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self._hash.update(data)
+        self._file.write(data)
+        self.size += len(data)
+
+    def commit(self):
+        """Move the blob into place and return (sha256 hex digest, size in bytes)"""
+        self._file.close()
+        digest = self._hash.hexdigest()
+        path = blob_path(digest, self.root)
+        if os.path.exists(path):
+            os.unlink(self.tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self.tmp_path, path)
+        self.tmp_path = None
+        return digest, self.size
+
+    def abort(self):
+        """Discard the partial blob; a no-op once committed"""
+        if self.tmp_path is None:
+            return
+        self._file.close()
+        try:
+            os.unlink(self.tmp_path)
+        except FileNotFoundError:
+            pass
+        self.tmp_path = None
+
+def open_blob(digest, root=None):
+    return open(blob_path(digest, root), 'rb')
+
+def read_blob(digest, root=None):
+    with open(blob_path(digest, root), 'rb') as f:
+        return f.read()
+
+def delete_blob(digest, root=None):
+    try:
+        os.unlink(blob_path(digest, root))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,130 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+from app.db.db import run_write
+from app.metrics.registry import Counter
+from app.models.derivative import image_in_use, mark_pending, record_derivative, record_failure, unreferenced_blobs
+from app.storage.blobs import delete_blob, get_store_root
+from app.utils.images import PILLOW_AVAILABLE, render_derivatives
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_RENDERED = Counter("image_derivatives_total", "Images run through the derivative pipeline", ["result"])
+
+# derivative name -> longest edge in pixels; served by /images/download/<id>?size=
+DERIVATIVE_SIZES = {"thumb": 320, "medium": 1080}
+
+# renders run at lower CPU priority than the web workers
+RENDER_NICENESS = 10
+
+# one pool per process, created on first use (and again after a fork)
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+# source hashes this process is rendering, so repeated requests don't queue duplicates
+_in_flight = set()
+
+def derivatives_enabled():
+    return PILLOW_AVAILABLE and current_app.config['DERIVATIVES_ENABLED']
+
+def get_executor(replace=None):
+    """This process's render pool; workers are spawned rather than forked from a threaded web worker.
+
+    Pass the current pool as `replace` to start a new one after it broke.
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid() or _executor is replace:
+            _executor = ProcessPoolExecutor(
+                max_workers=current_app.config['DERIVATIVE_WORKERS'],
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=os.nice,
+                initargs=(RENDER_NICENESS,)
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+def submit_render(source_hash, sizes):
+    """Start rendering `sizes` of a stored image in the pool and return the future"""
+    args = (render_derivatives, source_hash, {name: DERIVATIVE_SIZES[name] for name in sizes},
+            get_store_root(), current_app.config['DERIVATIVE_WEBP_QUALITY'])
+    executor = get_executor()
+    try:
+        return executor.submit(*args)
+    except BrokenProcessPool:
+        # a render worker died (e.g. killed for using too much memory)
+        logger.warning("Render pool is broken; starting a new one")
+        return get_executor(replace=executor).submit(*args)
+
+def record_render(source_hash, sizes, future):
+    """Store the outcome of a finished render; needs an app context"""
+    try:
+        results = future.result()
+        error = None
+    except Exception as e:
+        results = {}
+        error = f"{type(e).__name__}: {e}"[:500]
+        logger.warning("Could not render derivatives of %s: %s", source_hash, error)
+
+    root = get_store_root()
+
+    def write(db):
+        # the image was replaced or deleted while it rendered: release_blob has
+        # already dropped its derivative rows, so the rendered files go too
+        if not image_in_use(db, source_hash):
+            for blob_hash in unreferenced_blobs(db, [result[0] for result in results.values()]):
+                delete_blob(blob_hash, root)
+            return False
+        for name in sizes:
+            if name in results:
+                record_derivative(db, source_hash, name, *results[name])
+            else:
+                record_failure(db, source_hash, name, error)
+        return True
+
+    recorded = run_write(write)
+    DERIVATIVES_RENDERED.labels("failed" if error else "ok" if recorded else "discarded").inc()
+
+def schedule_derivatives(source_hash, sizes=None, force=False):
+    """Queue derivatives of a stored image for rendering off the request thread.
+
+    Safe to call repeatedly: sizes that are ready (unless force) or already
+    rendering in this process are skipped. Renders are content-addressed, so a
+    duplicate from another process just records the same result.
+    """
+    if not source_hash or not derivatives_enabled():
+        return
+    with _executor_lock:
+        if source_hash in _in_flight:
+            return
+        _in_flight.add(source_hash)
+
+    try:
+        pending = run_write(lambda db: mark_pending(db, source_hash, sizes or DERIVATIVE_SIZES, force))
+        if not pending:
+            _in_flight.discard(source_hash)
+            return
+        future = submit_render(source_hash, pending)
+    except Exception:
+        _in_flight.discard(source_hash)
+        logger.exception("Could not schedule derivatives of %s", source_hash)
+        return
+
+    app = current_app._get_current_object()
+
+    def done(future):
+        # runs on the pool's result thread; keep it to one small write
+        try:
+            with app.app_context():
+                record_render(source_hash, pending, future)
+        except Exception:
+            logger.exception("Could not record derivatives of %s", source_hash)
+        finally:
+            _in_flight.discard(source_hash)
+
+    future.add_done_callback(done)
@@ -0,0 +1,43 @@
+import zlib
+from flask import current_app, request
+
+# brotli is optional; without it only gzip is offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# preferred first when the client accepts both with the same quality
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+def negotiate_encoding():
+    """Best content encoding for this request's Accept-Encoding, or None for identity"""
+    if not current_app.config['COMPRESS_ENABLED']:
+        return None
+    return request.accept_encodings.best_match(ENCODINGS)
+
+def compress_body(data, encoding):
+    """Compress a complete body"""
+    if encoding == "br":
+        return brotli.compress(data, quality=current_app.config['COMPRESS_BROTLI_QUALITY'])
+    compressor = zlib.compressobj(current_app.config['COMPRESS_GZIP_LEVEL'], zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of byte chunks as it is consumed"""
+    # settings are read now; the chunks are consumed after the view has returned
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=current_app.config['COMPRESS_BROTLI_QUALITY'])
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(current_app.config['COMPRESS_GZIP_LEVEL'], zlib.DEFLATED, 31)
+        compress, finish = compressor.compress, compressor.flush
+
+    def generate():
+        for chunk in chunks:
+            out = compress(chunk)
+            if out:
+                yield out
+        yield finish()
+
+    return generate()
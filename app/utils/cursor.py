@@ -0,0 +1,45 @@
+import base64
+import json
+from flask import request
+
+def encode_cursor(*values):
+    """Encode key values into an opaque, URL-safe cursor string"""
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, arity):
+    """Decode a cursor produced by encode_cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+    if not isinstance(values, list) or len(values) != arity:
+        raise ValueError('Invalid cursor')
+
+    return tuple(values)
+
+def parse_limit(default_limit, max_limit):
+    """Read ?limit= from the query string, capped at max_limit, or raise ValueError"""
+    limit = request.args.get('limit', default_limit)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, max_limit)
+
+def parse_page_args(default_limit, max_limit, arity=2):
+    """Read ?limit= and ?cursor= from the query string, returning (limit, after) or raising ValueError"""
+    limit = parse_limit(default_limit, max_limit)
+
+    after = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        after = decode_cursor(cursor, arity)
+        if not all(isinstance(v, int) for v in after):
+            raise ValueError("Invalid cursor")
+
+    return limit, after
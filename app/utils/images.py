@@ -0,0 +1,35 @@
+import importlib.util
+import io
+from app.storage.blobs import blob_path, put_blob
+
+# Pillow is optional; without it no derivatives are made and the original is served
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+DERIVATIVE_MIME_TYPE = "image/webp"
+
+def render_derivatives(source_hash, sizes, root, quality):
+    """Resize a stored image to each of sizes ({name: longest edge in px}) as WebP.
+
+    Runs in a worker process, so it takes the blob store root explicitly and
+    imports Pillow there rather than in the web process. Each derivative is
+    written to the blob store; returns {name: (digest, byte size, width, height)}.
+    """
+    from PIL import Image, ImageOps
+
+    results = {}
+    with Image.open(blob_path(source_hash, root)) as original:
+        # let JPEG decode at a reduced scale when the output is much smaller
+        original.draft("RGB", (max(sizes.values()),) * 2)
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+        # largest first, so each size is scaled down from the previous one
+        for name, edge in sorted(sizes.items(), key=lambda item: -item[1]):
+            image.thumbnail((edge, edge), Image.LANCZOS)
+            out = io.BytesIO()
+            image.save(out, "WEBP", quality=quality, method=4)
+            digest, byte_size = put_blob(out.getvalue(), root)
+            results[name] = (digest, byte_size, image.width, image.height)
+
+    return results
@@ -0,0 +1,179 @@
+from itertools import chain
+from flask import request
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+from app.storage.blobs import BlobWriter
+
+# bytes read from the request body at a time
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# multipart field that carries the image file
+IMAGE_FIELD = "image"
+
+# enough of the file to recognise every supported format
+SNIFF_BYTES = 16
+
+def sniff_image_type(head):
+    """Mime type of an image from its leading magic bytes, or None if it is not a supported image"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in (b"avif", b"avis"):
+            return "image/avif"
+        if brand in (b"heic", b"heix", b"mif1", b"msf1"):
+            return "image/heic"
+    if head.startswith(b"BM"):
+        return "image/bmp"
+    return None
+
+def is_upload_request():
+    """Whether the request body is a multipart form or raw image bytes rather than JSON"""
+    mimetype = request.mimetype
+    return mimetype in ("multipart/form-data", "application/octet-stream") or mimetype.startswith("image/")
+
+class ImageUpload:
+    """One uploaded image, sniffed and hashed as it streams into the blob store.
+
+    Nothing is visible in the store until commit(); anything not committed is
+    removed by abort().
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.mime_type = None
+        self._head = b""
+        self._writer = BlobWriter()
+
+    def write(self, data):
+        if self.mime_type is None:
+            # hold back the first bytes until the format can be checked
+            self._head += data
+            if len(self._head) < SNIFF_BYTES:
+                return
+            self._check_type()
+            data, self._head = self._head, b""
+        self._writer.write(data)
+
+    def finish(self):
+        """Validate an upload shorter than SNIFF_BYTES once its body has ended"""
+        if self.mime_type is None:
+            if not self._head:
+                raise ValueError("Image is empty")
+            self._check_type()
+            self._writer.write(self._head)
+            self._head = b""
+        return self
+
+    def _check_type(self):
+        self.mime_type = sniff_image_type(self._head)
+        if self.mime_type is None:
+            raise ValueError("Unsupported image type")
+
+    @property
+    def size(self):
+        return self._writer.size
+
+    def commit(self):
+        # the type is checked as the first bytes arrive, so an image without one never got any data
+        if self.mime_type is None:
+            raise ValueError("Image is empty")
+        return self._writer.commit()
+
+    def abort(self):
+        self._writer.abort()
+
+def iter_body(stream):
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+def read_upload():
+    """Stream an image upload from the request body.
+
+    Accepts multipart/form-data (an "image" file part plus text fields) or a
+    raw image body with its text fields in the query string. Returns
+    (fields, upload) where upload is a finished ImageUpload or None. Raises
+    ValueError for malformed bodies and unsupported images, and
+    RequestEntityTooLarge once the body passes MAX_CONTENT_LENGTH, in both
+    cases without reading the rest of the body.
+    """
+    # request.stream enforces MAX_CONTENT_LENGTH, up front when the body has a
+    # Content-Length and while reading when it is chunked
+    stream = request.stream
+    if request.mimetype == "multipart/form-data":
+        boundary = request.mimetype_params.get("boundary")
+        if not boundary:
+            raise ValueError("Missing multipart boundary")
+        return read_multipart(stream, boundary.encode("latin-1"))
+
+    upload = ImageUpload()
+    try:
+        for chunk in iter_body(stream):
+            upload.write(chunk)
+        upload.finish()
+    except BaseException:
+        upload.abort()
+        raise
+    return request.args.to_dict(), upload
+
+def read_multipart(stream, boundary):
+    max_memory = request.max_form_memory_size
+    decoder = MultipartDecoder(boundary, max_memory, max_parts=request.max_form_parts)
+    fields = {}
+    upload = None
+    target = None
+    parts = []
+    field_bytes = 0
+
+    try:
+        # a final None tells the decoder the body has ended
+        for chunk in chain(iter_body(stream), [None]):
+            decoder.receive_data(chunk)
+            event = decoder.next_event()
+            while not isinstance(event, (NeedData, Epilogue)):
+                if isinstance(event, File) and not event.filename:
+                    # a form's file input with nothing chosen; ignore its (empty) data
+                    target = parts = None
+                elif isinstance(event, File):
+                    if event.name != IMAGE_FIELD or upload is not None:
+                        raise ValueError(f"Unexpected file field {event.name}")
+                    upload = target = ImageUpload(event.filename)
+                    parts = []
+                elif isinstance(event, Field):
+                    target = event.name
+                    parts = []
+                elif isinstance(event, Data) and parts is None:
+                    pass
+                elif isinstance(event, Data):
+                    if target is upload:
+                        upload.write(event.data)
+                        if not event.more_data:
+                            upload.finish()
+                    else:
+                        # text fields are small; cap what they can hold in memory
+                        field_bytes += len(event.data)
+                        if max_memory is not None and field_bytes > max_memory:
+                            raise RequestEntityTooLarge()
+                        parts.append(event.data)
+                        if not event.more_data:
+                            fields[target] = b"".join(parts).decode("utf-8")
+                event = decoder.next_event()
+    except UnicodeDecodeError as e:
+        if upload is not None:
+            upload.abort()
+        raise ValueError("Form fields must be UTF-8") from e
+    except BaseException:
+        if upload is not None:
+            upload.abort()
+        raise
+
+    return fields, upload
@@ -0,0 +1,53 @@
+import time
+import uuid
+from authlib.jose import JsonWebKey, jwt
+
+class AuthStub:
+    """Local stand-in for an Auth0 tenant: signs its own RS256 tokens and serves the JWKS offline.
+
+    install() points an ApiClient's fetches at this stub instead of
+    https://<domain>/, so require_auth verifies tokens with no network access.
+    """
+
+    def __init__(self, domain="bench.auth0.local", audience="bench-api"):
+        self.domain = domain
+        self.audience = audience
+        self.issuer = f"https://{domain}/"
+        self.kid = uuid.uuid4().hex
+        self._key = JsonWebKey.generate_key("RSA", 2048, is_private=True)
+
+    @property
+    def jwks(self):
+        public = self._key.as_dict(is_private=False)
+        public.update({"kid": self.kid, "use": "sig", "alg": "RS256"})
+        return {"keys": [public]}
+
+    @property
+    def metadata(self):
+        return {"issuer": self.issuer, "jwks_uri": f"{self.issuer}.well-known/jwks.json"}
+
+    def mint_token(self, sub, email=None, ttl=3600):
+        """A signed access token the stub's JWKS will verify"""
+        now = int(time.time())
+        claims = {"iss": self.issuer, "aud": self.audience, "sub": sub, "iat": now, "exp": now + ttl}
+        if email:
+            claims["email"] = email
+        header = {"alg": "RS256", "kid": self.kid, "typ": "JWT"}
+        return jwt.encode(header, claims, self._key).decode("ascii")
+
+    async def fetch(self, url):
+        """custom_fetch for ApiClientOptions: answers discovery and JWKS requests locally"""
+        if url.endswith("/.well-known/openid-configuration"):
+            return self.metadata
+        if url == self.metadata["jwks_uri"]:
+            return self.jwks
+        raise ValueError(f"AuthStub can't serve {url}")
+
+    def install(self, app):
+        """Point a created app's auth at this stub"""
+        from app.middleware import auth
+
+        app.config["AUTH0_DOMAIN"] = self.domain
+        app.config["AUTH0_AUDIENCE"] = self.audience
+        auth.init_auth(app)
+        auth.get_api_client().options.custom_fetch = self.fetch
@@ -0,0 +1,185 @@
+"""Drive the /api endpoints under concurrency and report throughput and latency as JSON.
+
+    python -m bench.seed --db bench.db --blobs bench-blobs --posts 5000
+    python -m bench.run --db bench.db --blobs bench-blobs --concurrency 16 --duration 20 --output run.json
+
+The app runs in-process behind a threaded WSGI server with its Auth0 client
+pointed at a local AuthStub, so authenticated endpoints need no network.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import make_server
+from bench.auth_stub import AuthStub
+from bench.seed import JPEG_MAGIC, make_app
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+class Scenario:
+    def __init__(self, name, build_request):
+        self.name = name
+        self.build_request = build_request
+
+def build_scenarios(base_url, post_ids, tokens, rng_lock, rng):
+    def pick(values):
+        with rng_lock:
+            return rng.choice(values)
+
+    def auth(headers=None):
+        headers = dict(headers or {})
+        headers["Authorization"] = f"Bearer {pick(tokens)}"
+        return headers
+
+    image = base64.b64encode(JPEG_MAGIC + os.urandom(32 * 1024)).decode("ascii")
+
+    return {
+        "list_posts": Scenario("list_posts", lambda: urllib.request.Request(f"{base_url}/api/posts")),
+        "list_posts_url": Scenario("list_posts_url", lambda: urllib.request.Request(f"{base_url}/api/posts?image=url")),
+        "serve_blob": Scenario("serve_blob", lambda: urllib.request.Request(f"{base_url}/api/images/download/{pick(post_ids)}")),
+        "search": Scenario("search", lambda: urllib.request.Request(f"{base_url}/api/search?q={pick(['cat', 'sunset', 'coffee', 'river'])}")),
+        "require_auth": Scenario("require_auth", lambda: urllib.request.Request(f"{base_url}/api/foobar", headers=auth())),
+        "create_post": Scenario("create_post", lambda: urllib.request.Request(
+            f"{base_url}/api/posts",
+            data=json.dumps({"image": image, "description": "bench upload", "mime_type": "image/jpeg"}).encode("utf-8"),
+            headers=auth({"Content-Type": "application/json"}),
+            method="POST"
+        )),
+        "create_comment": Scenario("create_comment", lambda: urllib.request.Request(
+            f"{base_url}/api/comments",
+            data=json.dumps({"post_id": pick(post_ids), "text": "bench comment"}).encode("utf-8"),
+            headers=auth({"Content-Type": "application/json"}),
+            method="POST"
+        )),
+    }
+
+def run_scenario(scenario, concurrency, duration, warmup):
+    """Hammer one scenario from `concurrency` threads for `duration` seconds"""
+    latencies = []
+    statuses = {}
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + warmup + duration
+    measure_from = time.perf_counter() + warmup
+
+    def worker():
+        nonlocal errors
+        while True:
+            started = time.perf_counter()
+            if started >= deadline:
+                return
+            try:
+                with urllib.request.urlopen(scenario.build_request(), timeout=60) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                e.read()
+                status = e.code
+            except Exception:
+                status = None
+            elapsed = time.perf_counter() - started
+
+            if started < measure_from:
+                continue
+            with lock:
+                if status is None or status >= 400:
+                    errors += 1
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                latencies.append(elapsed)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+
+    latencies.sort()
+    ms = [value * 1000 for value in latencies]
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "throughput_rps": round(len(latencies) / duration, 2),
+        "latency_ms": {
+            "mean": round(sum(ms) / len(ms), 3) if ms else None,
+            "p50": round(percentile(ms, 50), 3) if ms else None,
+            "p95": round(percentile(ms, 95), 3) if ms else None,
+            "p99": round(percentile(ms, 99), 3) if ms else None,
+            "max": round(ms[-1], 3) if ms else None,
+        },
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="bench.db")
+    parser.add_argument("--blobs", default="bench-blobs")
+    parser.add_argument("--scenarios", default="list_posts,list_posts_url,serve_blob,search,require_auth,create_comment,create_post",
+                        help="comma separated scenario names")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before each scenario")
+    parser.add_argument("--tokens", type=int, default=50, help="distinct users issuing authenticated requests")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist; create it with python -m bench.seed")
+
+    app = make_app(args.db, args.blobs)
+    stub = AuthStub()
+    stub.install(app)
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    with app.app_context():
+        from app.db.db import get_db
+        post_ids = [row["id"] for row in get_db().execute("SELECT id FROM images")]
+    if not post_ids:
+        parser.error(f"{args.db} has no posts")
+
+    tokens = [stub.mint_token(f"bench|{i}", email=f"bench_{i}@example.com") for i in range(args.tokens)]
+    scenarios = build_scenarios(base_url, post_ids, tokens, threading.Lock(), random.Random(0))
+
+    report = {
+        "started_at": int(time.time()),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "params": {"concurrency": args.concurrency, "duration": args.duration, "warmup": args.warmup, "posts": len(post_ids)},
+        "scenarios": {},
+    }
+    try:
+        for name in [name.strip() for name in args.scenarios.split(",") if name.strip()]:
+            if name not in scenarios:
+                parser.error(f"Unknown scenario {name}; choose from {', '.join(scenarios)}")
+            report["scenarios"][name] = run_scenario(scenarios[name], args.concurrency, args.duration, args.warmup)
+    finally:
+        server.shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
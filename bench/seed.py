@@ -0,0 +1,97 @@
+"""Generate a synthetic database and blob store for benchmarks.
+
+    python -m bench.seed --db bench.db --blobs bench-blobs --posts 5000 --comments-per-post 5
+"""
+import argparse
+import os
+import random
+import time
+
+# enough of a JPEG header for content sniffing; the rest is random bytes
+JPEG_MAGIC = b"\xff\xd8\xff\xe0"
+
+WORDS = ("sunset", "cat", "dog", "mountain", "coffee", "city", "beach", "street", "friends", "lake",
+         "forest", "snow", "bike", "garden", "concert", "food", "sky", "bridge", "river", "morning")
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def seed_database(app, posts=1000, comments_per_post=5, users=100, image_size=64 * 1024, distinct_images=50, seed=0):
+    """Fill the app's configured database and blob store with synthetic users, posts and comments"""
+    from app.db.db import init_db, transaction, bump_data_version
+    from app.storage.blobs import put_blob
+
+    rng = random.Random(seed)
+    with app.app_context():
+        init_db()
+
+        # a pool of distinct images shared by the posts, like repeated uploads in practice
+        images = []
+        for _ in range(max(1, distinct_images)):
+            size = max(len(JPEG_MAGIC), int(rng.gauss(image_size, image_size / 4)))
+            images.append(put_blob(JPEG_MAGIC + rng.randbytes(size - len(JPEG_MAGIC))))
+
+        now = int(time.time())
+        with transaction() as db:
+            user_ids = [
+                db.execute(
+                    "INSERT INTO users (username, auth0_sub) VALUES (?, ?) RETURNING id",
+                    (f"bench_user_{i}", f"bench|{i}")
+                ).fetchone()[0]
+                for i in range(users)
+            ]
+
+            for i in range(posts):
+                image_hash, image_size_bytes = rng.choice(images)
+                uploaded_at = now - (posts - i) * 60
+                post_id = db.execute(
+                    "INSERT INTO images (user_id, name, description, image_hash, image_size, mime_type, uploaded_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) RETURNING id",
+                    (rng.choice(user_ids), f"image_{i}.jpg", sentence(rng, 8), image_hash, image_size_bytes, "image/jpeg", uploaded_at, uploaded_at)
+                ).fetchone()[0]
+
+                db.executemany(
+                    "INSERT INTO comments (image_id, user_id, comment_text, created_at) VALUES (?, ?, ?, ?)",
+                    [(post_id, rng.choice(user_ids), sentence(rng, 6), uploaded_at + j) for j in range(comments_per_post)]
+                )
+
+            db.execute("UPDATE images SET comment_count = ?", (comments_per_post,))
+            bump_data_version(db)
+
+    return {"users": users, "posts": posts, "comments": posts * comments_per_post, "distinct_images": len(images)}
+
+def make_app(db_path, blob_path):
+    # create_app needs Auth0 settings; benchmarks replace them with an AuthStub anyway
+    os.environ.setdefault("AUTH0_DOMAIN", "bench.auth0.local")
+    os.environ.setdefault("AUTH0_AUDIENCE", "bench-api")
+    # every benchmark request comes from one IP and a few users; measure capacity, not the limiter
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    from app import create_app
+
+    app = create_app('production')
+    app.config["DATABASE_PATH"] = os.path.abspath(db_path)
+    app.config["BLOB_STORE_PATH"] = os.path.abspath(blob_path)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="bench.db")
+    parser.add_argument("--blobs", default="bench-blobs")
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--comments-per-post", type=int, default=5)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--image-size", type=int, default=64 * 1024, help="mean image size in bytes")
+    parser.add_argument("--distinct-images", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        parser.error(f"{args.db} already exists")
+
+    counts = seed_database(
+        make_app(args.db, args.blobs), posts=args.posts, comments_per_post=args.comments_per_post,
+        users=args.users, image_size=args.image_size, distinct_images=args.distinct_images, seed=args.seed
+    )
+    print(counts)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Measure cold start: import cost of create_app and time to the first 200 on /api/health.
+
+    python -m bench.startup --runs 5 --output startup.json
+    python -m bench.startup --import-budget-ms 350     # exit 1 when over budget
+
+Each measurement starts a fresh interpreter against an empty temp database,
+the way a newly scheduled container boots.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# imported on first use rather than by create_app; any of these at startup is a regression
+LAZY_MODULES = ("auth0_api_python", "authlib", "dotenv", "PIL")
+
+SERVE_WERKZEUG = (
+    "import sys; from werkzeug.serving import make_server; from wsgi import app; "
+    "make_server('127.0.0.1', int(sys.argv[1]), app, threaded=True).serve_forever()"
+)
+
+def child_env(tmp):
+    env = dict(os.environ)
+    env.setdefault("AUTH0_DOMAIN", "bench.auth0.local")
+    env.setdefault("AUTH0_AUDIENCE", "bench-api")
+    env["DATABASE_PATH"] = os.path.join(tmp, "startup.db")
+    env["BLOB_STORE_PATH"] = os.path.join(tmp, "blobs")
+    env["LOG_LEVEL"] = "WARNING"
+    return env
+
+def profile_imports():
+    """Run create_app under -X importtime; returns (total ms, slowest top-level imports, lazy modules seen)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "from app import create_app; create_app('production')"],
+            cwd=ROOT, env=child_env(tmp), capture_output=True, text=True, check=True
+        )
+
+    total_us = 0
+    top_level = []
+    seen = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        total_us += int(self_us)
+        module = name.strip()
+        seen.add(module.split(".")[0])
+        # top-level imports are the ones not indented under another
+        if not name[1:].startswith(" "):
+            top_level.append((int(cumulative_us), module))
+
+    top_level.sort(reverse=True)
+    slowest = [{"module": module, "ms": round(us / 1000, 1)} for us, module in top_level[:10]]
+    return total_us / 1000, slowest, sorted(seen.intersection(LAZY_MODULES))
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def time_to_first_200(server, timeout=30):
+    """Seconds from spawning the server process to its first 200 on /api/health"""
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = child_env(tmp)
+        if server == "gunicorn":
+            env["WEB_CONCURRENCY"] = "1"
+            env["BIND"] = f"127.0.0.1:{port}"
+            command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"]
+        else:
+            command = [sys.executable, "-c", SERVE_WERKZEUG, str(port)]
+
+        started = time.perf_counter()
+        process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            url = f"http://127.0.0.1:{port}/api/health"
+            while time.perf_counter() - started < timeout:
+                try:
+                    with urllib.request.urlopen(url, timeout=1) as response:
+                        if response.status == 200:
+                            return time.perf_counter() - started
+                except (urllib.error.URLError, ConnectionError):
+                    pass
+                if process.poll() is not None:
+                    raise RuntimeError(f"{server} exited with {process.returncode} before serving")
+                time.sleep(0.005)
+            raise RuntimeError(f"No 200 from {url} within {timeout}s")
+        finally:
+            process.terminate()
+            process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--server", choices=["werkzeug", "gunicorn"], default="werkzeug")
+    parser.add_argument("--import-budget-ms", type=float, help="fail when create_app's imports take longer")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    import_runs = [profile_imports() for _ in range(args.runs)]
+    import_ms = statistics.median(total for total, _, _ in import_runs)
+    _, slowest, lazy_seen = import_runs[-1]
+    first_200 = [time_to_first_200(args.server) * 1000 for _ in range(args.runs)]
+
+    report = {
+        "python": sys.version.split()[0],
+        "server": args.server,
+        "runs": args.runs,
+        "import_ms": round(import_ms, 1),
+        "slowest_imports": slowest,
+        "eager_lazy_modules": lazy_seen,
+        "time_to_first_200_ms": {
+            "median": round(statistics.median(first_200), 1),
+            "min": round(min(first_200), 1),
+            "max": round(max(first_200), 1),
+        },
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    failures = []
+    if lazy_seen:
+        failures.append(f"imported at startup but meant to be lazy: {', '.join(lazy_seen)}")
+    if args.import_budget_ms is not None and import_ms > args.import_budget_ms:
+        failures.append(f"imports took {import_ms:.1f} ms, budget {args.import_budget_ms:.1f} ms")
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
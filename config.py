@@ -1,20 +1,112 @@
 # config.py
 import os
 from pathlib import Path
-from dotenv import load_dotenv
 
-# Load .env from same directory as config.py (backend/)
+# Load .env from same directory as config.py (backend/); deployments that set the
+# environment directly have no .env and skip importing python-dotenv
 basedir = Path(__file__).parent.absolute()
 env_path = basedir / '.env'
 
-load_dotenv(env_path)
+if env_path.exists():
+    from dotenv import load_dotenv
+    load_dotenv(env_path)
 
 class Config:
     """Base configuration"""
     SECRET_KEY = os.getenv("FLASK_SECRET_KEY", "dev-secret")
     AUTH0_DOMAIN = os.getenv("AUTH0_DOMAIN")
     AUTH0_AUDIENCE = os.getenv("AUTH0_AUDIENCE")
-    DATABASE_PATH = "database.db"
+    TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+    # upper bound on how long verified claims are reused, even if exp is later
+    TOKEN_CACHE_MAX_TTL = int(os.getenv("TOKEN_CACHE_MAX_TTL", 3600))
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+    JWKS_REFRESH_INTERVAL = int(os.getenv("JWKS_REFRESH_INTERVAL", 600))
+    AUTH_VERIFY_TIMEOUT = float(os.getenv("AUTH_VERIFY_TIMEOUT", 10))
+    # token buckets per client (auth0 sub, or IP on anonymous routes), per worker process
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+    RATE_LIMIT_READ_PER_SEC = float(os.getenv("RATE_LIMIT_READ_PER_SEC", 20))
+    RATE_LIMIT_READ_BURST = float(os.getenv("RATE_LIMIT_READ_BURST", 60))
+    RATE_LIMIT_WRITE_PER_SEC = float(os.getenv("RATE_LIMIT_WRITE_PER_SEC", 2))
+    RATE_LIMIT_WRITE_BURST = float(os.getenv("RATE_LIMIT_WRITE_BURST", 10))
+    RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", 100000))
+    # load shedding (503): in-flight requests per worker, and time spent queued in front
+    # of the app per the proxy's X-Request-Start header; 0 turns a check off
+    SHED_MAX_IN_FLIGHT = int(os.getenv("SHED_MAX_IN_FLIGHT", 64))
+    SHED_MAX_QUEUE_MS = int(os.getenv("SHED_MAX_QUEUE_MS", 1000))
+    # reverse proxies in front of the app that append to X-Forwarded-For / set
+    # X-Forwarded-Proto; the per-IP rate limit keys on the client address they
+    # report. 0 trusts neither header, so it must match the real deployment
+    PROXY_FIX_X_FOR = int(os.getenv("PROXY_FIX_X_FOR", 0))
+    PROXY_FIX_X_PROTO = int(os.getenv("PROXY_FIX_X_PROTO", 0))
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    # directory shared by the workers of one server: each writes its metrics there every
+    # METRICS_FLUSH_INTERVAL seconds and /metrics sums them (set up by gunicorn.conf.py);
+    # empty serves the scraped process's own metrics only
+    METRICS_DIR = os.getenv("METRICS_DIR", "")
+    METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 1))
+    # gzip/brotli for /api JSON responses; bodies under COMPRESS_MIN_SIZE bytes are sent as is
+    COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "true").lower() in ("1", "true", "yes")
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+    COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 5))
+    DATABASE_PATH = os.getenv("DATABASE_PATH", "database.db")
+    SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", 8))
+    SQLITE_POOL_TIMEOUT = float(os.getenv("SQLITE_POOL_TIMEOUT", 10))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 16 * 1024))
+    # opt-in group commit: one writer thread per process merges concurrent small writes
+    # into one transaction of up to WRITE_QUEUE_MAX_BATCH writes, waiting at most
+    # WRITE_QUEUE_MAX_LATENCY_MS for a batch to fill; enqueueing waits up to
+    # WRITE_QUEUE_TIMEOUT seconds for room before the request gets 503
+    WRITE_QUEUE_ENABLED = os.getenv("WRITE_QUEUE_ENABLED", "false").lower() in ("1", "true", "yes")
+    WRITE_QUEUE_MAX_BATCH = int(os.getenv("WRITE_QUEUE_MAX_BATCH", 64))
+    WRITE_QUEUE_MAX_LATENCY_MS = float(os.getenv("WRITE_QUEUE_MAX_LATENCY_MS", 2))
+    WRITE_QUEUE_SIZE = int(os.getenv("WRITE_QUEUE_SIZE", 1024))
+    WRITE_QUEUE_TIMEOUT = float(os.getenv("WRITE_QUEUE_TIMEOUT", 1))
+    BLOB_STORE_PATH = os.getenv("BLOB_STORE_PATH", "blobs")
+    # largest request body accepted (uploads, including base64 JSON); larger ones get 413
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", 32 * 1024 * 1024))
+    # seconds browsers and CDNs may reuse an original image fetched through a versioned
+    # URL (?v=<content hash>, as feeds link them); unversioned URLs and resized copies
+    # (?size=) always revalidate
+    IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", 365 * 24 * 3600))
+    # thumb/medium WebP copies of uploads, rendered by a pool of DERIVATIVE_WORKERS
+    # processes per web worker; needs Pillow, without it originals are served
+    DERIVATIVES_ENABLED = os.getenv("DERIVATIVES_ENABLED", "true").lower() in ("1", "true", "yes")
+    DERIVATIVE_WORKERS = int(os.getenv("DERIVATIVE_WORKERS", 1))
+    DERIVATIVE_WEBP_QUALITY = int(os.getenv("DERIVATIVE_WEBP_QUALITY", 80))
+
+    # Feed pagination
+    FEED_PAGE_SIZE = int(os.getenv("FEED_PAGE_SIZE", 20))
+    FEED_MAX_PAGE_SIZE = int(os.getenv("FEED_MAX_PAGE_SIZE", 100))
+    FEED_CACHE_SIZE = int(os.getenv("FEED_CACHE_SIZE", 64))
+    FEED_CACHE_TTL = int(os.getenv("FEED_CACHE_TTL", 60))
+    FEED_CACHE_MAX_ENTRY_BYTES = int(os.getenv("FEED_CACHE_MAX_ENTRY_BYTES", 8 * 1024 * 1024))
+    FEED_COMMENTS_PER_POST = int(os.getenv("FEED_COMMENTS_PER_POST", 10))
+    COMMENTS_PAGE_SIZE = int(os.getenv("COMMENTS_PAGE_SIZE", 20))
+    COMMENTS_MAX_PAGE_SIZE = int(os.getenv("COMMENTS_MAX_PAGE_SIZE", 100))
+    COMMENTS_BATCH_MAX = int(os.getenv("COMMENTS_BATCH_MAX", 100))
+    POST_BATCH_MAX_IDS = int(os.getenv("POST_BATCH_MAX_IDS", 100))
+    # rows (changed posts, comments and deletions) per /posts/changes page
+    SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", 200))
+    SYNC_MAX_PAGE_SIZE = int(os.getenv("SYNC_MAX_PAGE_SIZE", 1000))
+    SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", 20))
+    SEARCH_MAX_PAGE_SIZE = int(os.getenv("SEARCH_MAX_PAGE_SIZE", 50))
+
+    # /posts/stream (Server-Sent Events). Each open stream holds a server thread for
+    # up to EVENTS_STREAM_MAX_SECONDS, so by default a worker allows streams on at
+    # most half of its GUNICORN_THREADS and keeps the rest for ordinary requests.
+    # The server as a whole holds WEB_CONCURRENCY x EVENTS_MAX_STREAMS streams; past
+    # that a client gets 503 telling it to poll the feed with If-None-Match every
+    # EVENTS_FALLBACK_POLL_SECONDS instead (a 304 while nothing changed)
+    EVENTS_MAX_STREAMS = int(os.getenv("EVENTS_MAX_STREAMS", max(1, int(os.getenv("GUNICORN_THREADS", 4)) // 2)))
+    EVENTS_FALLBACK_POLL_SECONDS = int(os.getenv("EVENTS_FALLBACK_POLL_SECONDS", 30))
+    EVENTS_STREAM_MAX_SECONDS = float(os.getenv("EVENTS_STREAM_MAX_SECONDS", 300))
+    EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", 15))
+    EVENTS_POLL_INTERVAL_MS = float(os.getenv("EVENTS_POLL_INTERVAL_MS", 250))
+    EVENTS_BUFFER_SIZE = int(os.getenv("EVENTS_BUFFER_SIZE", 256))
 
 class DevelopmentConfig(Config):
     """Development configuration"""
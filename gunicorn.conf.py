@@ -0,0 +1,68 @@
+# gunicorn.conf.py - production server settings; run with: gunicorn -c gunicorn.conf.py
+#
+# The app is imported once in the master (preload_app) and forked into the
+# workers. `kill -HUP <master>` restarts workers gracefully with the same code;
+# to deploy new code start a new master with `kill -USR2` and stop the old one
+# with `kill -TERM` once the new workers are ready.
+import glob
+import multiprocessing
+import os
+import tempfile
+
+wsgi_app = "wsgi:app"
+bind = os.getenv("BIND", "0.0.0.0:5000")
+
+# processes x threads; SQLite allows one writer at a time, so more threads
+# mostly help the read-heavy feed and image requests
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+
+# Every open /posts/stream (Server-Sent Events) connection holds one of these
+# threads, so the server can hold workers x EVENTS_MAX_STREAMS streams (by
+# default half of `threads` per worker). Past that /posts/stream answers 503 with
+# Retry-After and clients poll /api/posts with If-None-Match instead, getting a
+# 304 until something changes. To hold more streams, raise GUNICORN_THREADS along
+# with EVENTS_MAX_STREAMS; idle streams cost a thread and little else.
+
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+# recycle workers now and then so slow leaks can't build up
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 1000))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+# Metrics live in each worker's memory, and a Prometheus scrape of /metrics
+# reaches whichever worker accepts it. So every worker writes a snapshot of its
+# registry to METRICS_DIR about once a second (METRICS_FLUSH_INTERVAL) and
+# /metrics serves the sum of all of them. Counters and histograms of exited
+# workers are kept in METRICS_DIR/dead.json by child_exit below, so totals only
+# reset when the whole server restarts; gauges cover live workers only. Set here,
+# before the app (and its Config) is imported; the directory is cleared on start.
+os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="metrics-"))
+
+def on_starting(server):
+    os.makedirs(os.environ["METRICS_DIR"], exist_ok=True)
+    for path in glob.glob(os.path.join(os.environ["METRICS_DIR"], "*.json")):
+        os.remove(path)
+
+def child_exit(server, worker):
+    from app.metrics.multiprocess import mark_process_dead
+    mark_process_dead(os.environ["METRICS_DIR"], worker.pid)
+
+def post_fork(server, worker):
+    from app.metrics.multiprocess import start_worker
+    config = server.app.wsgi().config
+    if config['METRICS_ENABLED']:
+        start_worker(config['METRICS_DIR'], config['METRICS_FLUSH_INTERVAL'])
+
+def when_ready(server):
+    # runs in the master after the app is loaded and before workers are forked
+    from app.startup import prepare_for_serving
+    prepare_for_serving(server.app.wsgi())
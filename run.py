@@ -10,9 +10,9 @@ if __name__ == "__main__":
     with app.app_context():
         init_db()
     
-    print("[INFO] Starting Flask server...")
-    print(f"[INFO] AUTH0_DOMAIN: {app.config['AUTH0_DOMAIN']}")
-    print(f"[INFO] AUTH0_AUDIENCE: {app.config['AUTH0_AUDIENCE']}")
+    app.logger.info("Starting Flask server...")
+    app.logger.info("AUTH0_DOMAIN: %s", app.config['AUTH0_DOMAIN'])
+    app.logger.info("AUTH0_AUDIENCE: %s", app.config['AUTH0_AUDIENCE'])
     
     host = "0.0.0.0" if os.path.exists("/.dockerenv") else "127.0.0.1"
     app.run(host=host, port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,71 @@
+import os
+import pytest
+
+# config.py reads the environment once, at import
+os.environ.setdefault("AUTH0_DOMAIN", "bench.auth0.local")
+os.environ.setdefault("AUTH0_AUDIENCE", "bench-api")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("DERIVATIVES_ENABLED", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from config import Config
+from app import create_app, events
+from app.cache import feed
+from app.models import user
+from app.db.db import ConnectionPool, init_db, close_pools
+from bench.auth_stub import AuthStub
+
+@pytest.fixture(scope="session")
+def auth_stub():
+    return AuthStub()
+
+@pytest.fixture
+def make_app(tmp_path, auth_stub, monkeypatch):
+    """Build an app against a fresh database; keyword arguments override Config settings"""
+    def make(**overrides):
+        for name, value in overrides.items():
+            monkeypatch.setattr(Config, name, value)
+
+        # process-wide caches would otherwise carry rows over from the previous test's database
+        feed.feed_cache = None
+        user.user_id_cache = None
+        events.broadcaster = None
+
+        flask_app = create_app('development')
+        flask_app.config["DATABASE_PATH"] = str(tmp_path / "test.db")
+        flask_app.config["BLOB_STORE_PATH"] = str(tmp_path / "blobs")
+        auth_stub.install(flask_app)
+        with flask_app.app_context():
+            init_db()
+        return flask_app
+
+    yield make
+    close_pools()
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def auth_headers(auth_stub):
+    def headers(sub="auth0|tester", email=None):
+        return {"Authorization": f"Bearer {auth_stub.mint_token(sub, email=email)}"}
+    return headers
+
+@pytest.fixture
+def statements(monkeypatch):
+    """SQL statements, with their parameters filled in, run on every connection opened from here on"""
+    executed = []
+    connect = ConnectionPool.connect
+
+    def traced_connect(self, **kwargs):
+        conn = connect(self, **kwargs)
+        conn.set_trace_callback(executed.append)
+        return conn
+
+    monkeypatch.setattr(ConnectionPool, "connect", traced_connect)
+    return executed
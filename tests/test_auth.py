@@ -0,0 +1,78 @@
+import asyncio
+import time
+import pytest
+from app.middleware import auth
+from bench.auth_stub import AuthStub
+
+# an authenticated write that needs no data: a comment on a missing post is a 404
+# once the token is accepted, and a 401 when it isn't
+def comment(client, token):
+    return client.post("/api/comments", json={"post_id": 1, "text": "hi"},
+                       headers={"Authorization": f"Bearer {token}"}).status_code
+
+@pytest.fixture
+def verifications(app, monkeypatch):
+    """Tokens that went to the Auth0 client for verification rather than the token cache"""
+    verified = []
+    api_client = auth.get_api_client()
+    verify = api_client.verify_access_token
+
+    async def counting_verify(token, *args, **kwargs):
+        verified.append(token)
+        return await verify(token, *args, **kwargs)
+
+    monkeypatch.setattr(api_client, "verify_access_token", counting_verify)
+    return verified
+
+def test_verified_token_is_served_from_the_cache(client, auth_stub, verifications):
+    token = auth_stub.mint_token("auth0|cached")
+    assert [comment(client, token) for _ in range(3)] == [404, 404, 404]
+    assert verifications == [token]
+
+def test_cached_claims_expire_with_the_token(client, auth_stub, verifications, monkeypatch):
+    token = auth_stub.mint_token("auth0|expiring", ttl=600)
+    assert comment(client, token) == 404
+    exp = auth.cached_claims(token)["exp"]
+
+    clock = time.time
+    monkeypatch.setattr(time, "time", lambda: exp - 1)
+    assert auth.cached_claims(token) is not None
+    monkeypatch.setattr(time, "time", lambda: exp)
+    assert auth.cached_claims(token) is None
+    monkeypatch.setattr(time, "time", clock)
+
+    # gone from the cache, so the next request verifies the token again
+    assert comment(client, token) == 404
+    assert verifications == [token, token]
+
+def test_cache_ttl_caps_long_lived_tokens(make_app, auth_stub, monkeypatch):
+    client = make_app(TOKEN_CACHE_MAX_TTL=60).test_client()
+    token = auth_stub.mint_token("auth0|long", ttl=24 * 3600)
+    assert comment(client, token) == 404
+
+    later = time.time() + 61
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert auth.cached_claims(token) is None
+
+def test_failed_refresh_keeps_the_old_keys(client, auth_stub):
+    auth.warm_keys()
+    keys = {key: auth.key_cache.get(key) for key in auth.key_cache.keys()}
+    assert len(keys) == 2  # discovery document and JWKS
+
+    async def unreachable(url):
+        raise OSError("Auth0 is unreachable")
+
+    auth.get_api_client().options.custom_fetch = unreachable
+    asyncio.run(auth.refresh_keys())
+
+    assert {key: auth.key_cache.get(key) for key in auth.key_cache.keys()} == keys
+    # tokens still verify against the keys fetched earlier
+    assert comment(client, auth_stub.mint_token("auth0|during-outage")) == 404
+
+def test_refresh_picks_up_rotated_keys(client, auth_stub):
+    auth.warm_keys()
+    rotated = AuthStub(auth_stub.domain, auth_stub.audience)
+    auth.get_api_client().options.custom_fetch = rotated.fetch
+    asyncio.run(auth.refresh_keys())
+
+    assert comment(client, rotated.mint_token("auth0|rotated")) == 404
@@ -0,0 +1,67 @@
+import os
+import threading
+from functools import partial
+from flask import g
+from app.db.db import get_db
+from app.models.post import add_post, delete_post
+from app.models.user import get_or_create_user
+from app.storage.blobs import blob_path, get_store_root, put_blob
+
+JPEG = b"\xff\xd8\xff\xe0" + b"shared bytes"
+
+def new_post(user_id, store_blob):
+    add_post(user_id, "image.jpg", "same picture", store_blob, "image/jpeg")
+    return get_db().execute("SELECT max(id) FROM images").fetchone()[0]
+
+def test_upload_after_the_last_reference_is_deleted_stores_the_blob_again(app):
+    with app.app_context():
+        g.user_claims = {"sub": "auth0|a"}
+        user_id = get_or_create_user("auth0|a")
+        first = new_post(user_id, partial(put_blob, JPEG, get_store_root()))
+
+        # a second upload of the same bytes finds the file already stored...
+        image_hash, _ = put_blob(JPEG)
+        # ...then the only post using it is deleted before the upload's row is written
+        assert delete_post(first, user_id)
+        assert not os.path.exists(blob_path(image_hash))
+
+        new_post(user_id, partial(put_blob, JPEG, get_store_root()))
+        assert os.path.exists(blob_path(image_hash))
+
+def test_delete_waits_for_an_upload_that_is_storing_the_same_blob(app):
+    with app.app_context():
+        g.user_claims = {"sub": "auth0|a"}
+        user_id = get_or_create_user("auth0|a")
+        first = new_post(user_id, partial(put_blob, JPEG, get_store_root()))
+    image_hash = put_blob(JPEG, app.config["BLOB_STORE_PATH"])[0]
+
+    storing = threading.Event()
+    finish_storing = threading.Event()
+
+    def slow_store():
+        storing.set()
+        finish_storing.wait(5)
+        return put_blob(JPEG, app.config["BLOB_STORE_PATH"])
+
+    def upload():
+        with app.app_context():
+            new_post(user_id, slow_store)
+
+    def delete():
+        with app.app_context():
+            delete_post(first, user_id)
+
+    uploader = threading.Thread(target=upload)
+    uploader.start()
+    assert storing.wait(5)
+    deleter = threading.Thread(target=delete)
+    deleter.start()
+    # the delete can't release the blob while the upload's write is open
+    deleter.join(0.2)
+    finish_storing.set()
+    uploader.join(5)
+    deleter.join(5)
+
+    with app.app_context():
+        assert [row[0] for row in get_db().execute("SELECT image_hash FROM images")] == [image_hash]
+    assert os.path.exists(blob_path(image_hash, app.config["BLOB_STORE_PATH"]))
@@ -0,0 +1,25 @@
+from functools import partial
+from flask import g
+from app.db.db import get_db
+from app.models.post import add_post
+from app.models.user import get_or_create_user
+from app.storage.blobs import get_store_root, put_blob
+
+def test_comment_on_a_missing_post_is_404(app, client, auth_headers):
+    response = client.post("/api/comments", json={"post_id": 999, "text": "hello?"}, headers=auth_headers())
+    assert response.status_code == 404
+    with app.app_context():
+        assert get_db().execute("SELECT count(*) FROM comments").fetchone()[0] == 0
+
+def test_comment_counts_towards_the_post(app, client, auth_headers):
+    with app.app_context():
+        g.user_claims = {"sub": "auth0|tester"}
+        add_post(get_or_create_user("auth0|tester"), "image.jpg", "a post", partial(put_blob, b"\xff\xd8\xff\xe0", get_store_root()), "image/jpeg")
+        post_id = get_db().execute("SELECT max(id) FROM images").fetchone()[0]
+
+    response = client.post("/api/comments", json={"post_id": post_id, "text": "first"}, headers=auth_headers())
+    assert response.status_code == 201
+
+    entry = client.get("/api/posts?image=url").get_json()["posts"][0]
+    assert entry["comment_count"] == 1
+    assert [c["text"] for c in entry["comments"]] == ["first"]
@@ -0,0 +1,65 @@
+import os
+from concurrent.futures import Future
+from functools import partial
+from flask import g
+from app.db.db import get_db, run_write
+from app.models.derivative import mark_pending
+from app.models.post import add_post, delete_post, update_post_image
+from app.models.user import get_or_create_user
+from app.storage.blobs import blob_path, get_store_root, put_blob
+from app.storage.derivatives import record_render
+
+ORIGINAL = b"\xff\xd8\xff\xe0" + b"original"
+REPLACEMENT = b"\xff\xd8\xff\xe0" + b"replacement"
+
+def add_image_post(data):
+    g.user_claims = {"sub": "auth0|tester"}
+    user_id = get_or_create_user("auth0|tester")
+    add_post(user_id, "image.jpg", "a photo", partial(put_blob, data, get_store_root()), "image/jpeg")
+    return user_id, get_db().execute("SELECT max(id) FROM images").fetchone()[0]
+
+def finished_render(source_hash, data):
+    """Mark a thumbnail pending as schedule_derivatives does, and return a finished render of it"""
+    assert run_write(lambda db: mark_pending(db, source_hash, ["thumb"])) == ["thumb"]
+    digest, byte_size = put_blob(data)
+    future = Future()
+    future.set_result({"thumb": (digest, byte_size, 32, 24)})
+    return digest, future
+
+def derivative_rows(source_hash):
+    return get_db().execute("SELECT size, status, blob_hash FROM image_derivatives WHERE source_hash = ?", (source_hash,)).fetchall()
+
+def test_render_of_a_current_image_is_recorded(app):
+    with app.app_context():
+        add_image_post(ORIGINAL)
+        source_hash = put_blob(ORIGINAL)[0]
+        digest, future = finished_render(source_hash, b"thumb of the original")
+
+        record_render(source_hash, ["thumb"], future)
+
+        assert [tuple(row) for row in derivative_rows(source_hash)] == [("thumb", "ready", digest)]
+        assert os.path.exists(blob_path(digest))
+
+def test_render_finishing_after_the_image_was_replaced_is_discarded(app):
+    with app.app_context():
+        _, post_id = add_image_post(ORIGINAL)
+        source_hash = put_blob(ORIGINAL)[0]
+        digest, future = finished_render(source_hash, b"thumb of the old image")
+
+        update_post_image(post_id, partial(put_blob, REPLACEMENT, get_store_root()), "image/jpeg")
+        record_render(source_hash, ["thumb"], future)
+
+        assert derivative_rows(source_hash) == []
+        assert not os.path.exists(blob_path(digest))
+
+def test_render_finishing_after_the_post_was_deleted_is_discarded(app):
+    with app.app_context():
+        user_id, post_id = add_image_post(ORIGINAL)
+        source_hash = put_blob(ORIGINAL)[0]
+        digest, future = finished_render(source_hash, b"thumb of a deleted image")
+
+        assert delete_post(post_id, user_id)
+        record_render(source_hash, ["thumb"], future)
+
+        assert derivative_rows(source_hash) == []
+        assert not os.path.exists(blob_path(digest))
@@ -0,0 +1,24 @@
+def test_streams_over_the_limit_are_sent_to_poll(make_app):
+    client = make_app(EVENTS_MAX_STREAMS=1, EVENTS_FALLBACK_POLL_SECONDS=20).test_client()
+    # the body is generated lazily, so the stream stays subscribed until closed
+    open_stream = client.get("/api/posts/stream", buffered=False)
+    assert open_stream.status_code == 200
+
+    try:
+        rejected = client.get("/api/posts/stream")
+        assert rejected.status_code == 503
+        assert rejected.headers["Retry-After"] == "20"
+        assert rejected.get_json()["poll"] == "/api/posts"
+        assert rejected.get_json()["poll_interval"] == 20
+    finally:
+        open_stream.close()
+
+    # polling the feed costs a 304 until something changes
+    feed = client.get("/api/posts")
+    assert feed.status_code == 200
+    assert client.get("/api/posts", headers={"If-None-Match": feed.headers["ETag"]}).status_code == 304
+
+    # a closed stream frees its slot
+    reopened = client.get("/api/posts/stream", buffered=False)
+    assert reopened.status_code == 200
+    reopened.close()
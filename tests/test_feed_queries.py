@@ -0,0 +1,50 @@
+from flask import g
+from app.db.db import get_db
+from app.models.comment import create_comments
+from app.models.post import add_post
+from app.models.user import get_or_create_user
+from app.storage.blobs import put_blob
+
+def add_posts(app, count, comments_per_post):
+    with app.app_context():
+        g.user_claims = {"sub": "auth0|poster"}
+        user_id = get_or_create_user("auth0|poster")
+        image_hash, image_size = put_blob(b"\xff\xd8\xff\xe0" + b"x" * 64)
+        for i in range(count):
+            add_post(user_id, "image.jpg", f"post {i}", lambda: (image_hash, image_size), "image/jpeg")
+        post_ids = [row[0] for row in get_db().execute("SELECT id FROM images ORDER BY id DESC LIMIT ?", (count,))][::-1]
+        create_comments(user_id, [(post_id, f"comment {j}") for post_id in post_ids for j in range(comments_per_post)])
+        return post_ids
+
+def feed_queries(client, statements):
+    del statements[:]
+    response = client.get("/api/posts?image=url&limit=100")
+    assert response.status_code == 200
+    return [sql for sql in statements if sql.lstrip().upper().startswith("SELECT")], response.get_json()
+
+def test_feed_query_count_does_not_grow_with_posts(app, client, statements):
+    add_posts(app, 3, comments_per_post=2)
+    few, _ = feed_queries(client, statements)
+
+    add_posts(app, 30, comments_per_post=2)
+    many, body = feed_queries(client, statements)
+
+    assert len(body["posts"]) == 33
+    assert len(many) == len(few)
+    assert len(many) <= 5
+
+def test_feed_reads_only_the_first_comments_of_a_long_thread(app, client, statements):
+    app.config["FEED_COMMENTS_PER_POST"] = 3
+    long_thread, quiet = add_posts(app, 2, comments_per_post=0)
+    with app.app_context():
+        g.user_claims = {"sub": "auth0|commenter"}
+        user_id = get_or_create_user("auth0|commenter")
+        create_comments(user_id, [(long_thread, f"comment {j}") for j in range(50)])
+
+    _, body = feed_queries(client, statements)
+    entries = {entry["id"]: entry for entry in body["posts"]}
+
+    assert entries[long_thread]["comment_count"] == 50
+    assert [c["text"] for c in entries[long_thread]["comments"]] == ["comment 0", "comment 1", "comment 2"]
+    assert entries[quiet]["comment_count"] == 0
+    assert entries[quiet]["comments"] == []
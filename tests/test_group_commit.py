@@ -0,0 +1,118 @@
+import sqlite3
+import threading
+import pytest
+from app.db.db import ConnectionPool
+from app.db.writer import GroupCommitWriter, WriteQueueFull
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "writes.db"), size=2, timeout=1, pragmas=[("foreign_keys", "ON")])
+    with pool.write_lock:
+        pool.writer().executescript("""
+            CREATE TABLE parents (id INTEGER PRIMARY KEY);
+            CREATE TABLE rows (
+                id INTEGER PRIMARY KEY,
+                value TEXT NOT NULL,
+                -- checked at COMMIT, so a bad row fails the whole batch rather than its savepoint
+                parent_id INTEGER REFERENCES parents(id) DEFERRABLE INITIALLY DEFERRED
+            );
+        """)
+    return pool
+
+def make_writer(pool, **overrides):
+    settings = dict(max_batch=64, max_latency=0, queue_size=64, enqueue_timeout=1)
+    settings.update(overrides)
+    return GroupCommitWriter(pool, **settings)
+
+def insert(value, parent_id=None):
+    def write(db):
+        return db.execute("INSERT INTO rows (value, parent_id) VALUES (?, ?)", (value, parent_id)).lastrowid
+    return write
+
+def fail(value):
+    def write(db):
+        insert(value)(db)
+        raise ValueError(f"rejected {value}")
+    return write
+
+def stored(pool):
+    conn = pool.acquire()
+    try:
+        return [row["value"] for row in conn.execute("SELECT value FROM rows ORDER BY id")]
+    finally:
+        pool.release(conn)
+
+def hold_writer(writer):
+    """Occupy the writer thread with a write that waits for the returned event"""
+    started, release = threading.Event(), threading.Event()
+
+    def write(db):
+        started.set()
+        release.wait(5)
+        return insert("held")(db)
+
+    future = writer.submit(write)
+    assert started.wait(5)
+    return future, release
+
+def test_writes_commit_in_submission_order(pool):
+    writer = make_writer(pool)
+    held, release = hold_writer(writer)
+    committed = []
+    futures = [writer.submit(insert(str(i)), after_commit=lambda row_id, i=i: committed.append(i)) for i in range(10)]
+    release.set()
+
+    row_ids = [future.result(5) for future in futures]
+    held.result(5)
+    assert row_ids == sorted(row_ids)
+    assert committed == list(range(10))
+    assert stored(pool) == ["held"] + [str(i) for i in range(10)]
+
+def test_failing_write_rolls_back_alone(pool):
+    writer = make_writer(pool)
+    held, release = hold_writer(writer)
+    committed = []
+    before = writer.submit(insert("before"), after_commit=committed.append)
+    failing = writer.submit(fail("failing"), after_commit=committed.append)
+    after = writer.submit(insert("after"), after_commit=committed.append)
+    release.set()
+
+    with pytest.raises(ValueError, match="rejected failing"):
+        failing.result(5)
+    assert committed == [before.result(5), after.result(5)]
+    assert stored(pool) == ["held", "before", "after"]
+
+def test_commit_failure_reaches_every_write_in_the_batch(pool):
+    writer = make_writer(pool)
+    held, release = hold_writer(writer)
+    committed = []
+    futures = [
+        writer.submit(insert("ok"), after_commit=committed.append),
+        writer.submit(insert("orphan", parent_id=42), after_commit=committed.append),
+    ]
+    release.set()
+
+    # the held write committed in a batch of its own before the others were queued
+    assert held.result(5)
+    for future in futures:
+        with pytest.raises(sqlite3.IntegrityError):
+            future.result(5)
+    assert committed == []
+    assert stored(pool) == ["held"]
+
+    # the transaction was rolled back, so the writer keeps going
+    assert writer.submit(insert("next")).result(5)
+    assert stored(pool) == ["held", "next"]
+
+def test_full_queue_pushes_back(pool):
+    writer = make_writer(pool, max_batch=1, queue_size=1, enqueue_timeout=0.05)
+    held, release = hold_writer(writer)
+    queued = writer.submit(insert("queued"))
+
+    with pytest.raises(WriteQueueFull):
+        writer.submit(insert("rejected"))
+
+    release.set()
+    held.result(5)
+    queued.result(5)
+    assert stored(pool) == ["held", "queued"]
@@ -0,0 +1,84 @@
+from functools import partial
+from urllib.parse import parse_qs, urlsplit
+from flask import g
+from app.db.db import get_db, run_write
+from app.models.derivative import mark_pending, record_derivative
+from app.models.post import add_post, update_post_image
+from app.models.user import get_or_create_user
+from app.storage.blobs import get_store_root, put_blob
+
+FIRST = b"\xff\xd8\xff\xe0" + b"first"
+SECOND = b"\xff\xd8\xff\xe0" + b"second"
+
+def add_image_post(app, data):
+    with app.app_context():
+        g.user_claims = {"sub": "auth0|tester"}
+        add_post(get_or_create_user("auth0|tester"), "image.jpg", "a photo", partial(put_blob, data, get_store_root()), "image/jpeg")
+        return get_db().execute("SELECT max(id) FROM images").fetchone()[0]
+
+def feed_image_url(client):
+    return client.get("/api/posts?image=url").get_json()["posts"][0]["image_url"]
+
+def test_feed_links_a_versioned_url_that_is_cached_for_good(app, client):
+    post_id = add_image_post(app, FIRST)
+    url = feed_image_url(client)
+    assert urlsplit(url).path == f"/api/images/download/{post_id}"
+
+    response = client.get(url)
+    assert response.data == FIRST
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == app.config["IMAGE_CACHE_MAX_AGE"]
+
+def test_unversioned_url_is_revalidated(app, client):
+    post_id = add_image_post(app, FIRST)
+
+    response = client.get(f"/api/images/download/{post_id}")
+    assert response.cache_control.no_cache
+    assert not response.cache_control.immutable
+
+    revalidated = client.get(f"/api/images/download/{post_id}", headers={"If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+def test_replacing_the_image_changes_the_url(app, client):
+    post_id = add_image_post(app, FIRST)
+    old_url = feed_image_url(client)
+
+    with app.app_context():
+        update_post_image(post_id, partial(put_blob, SECOND, get_store_root()), "image/jpeg")
+
+    new_url = feed_image_url(client)
+    assert parse_qs(urlsplit(new_url).query)["v"] != parse_qs(urlsplit(old_url).query)["v"]
+    assert client.get(new_url).data == SECOND
+
+    # an old link still works, but is no longer cacheable
+    stale = client.get(old_url)
+    assert stale.data == SECOND
+    assert stale.cache_control.no_cache
+
+def test_search_batch_and_changes_link_versioned_urls(app, client):
+    post_id = add_image_post(app, FIRST)
+    feed_url = feed_image_url(client)
+
+    search = client.get("/api/search?q=photo").get_json()["results"]
+    batch = client.get(f"/api/posts/batch?ids={post_id}&image=url").get_json()["posts"]
+    changes = client.get("/api/posts/changes?image=url").get_json()["posts"]
+    assert search[0]["image_url"] == batch[0]["image_url"] == changes[0]["image_url"] == feed_url
+
+def test_derivative_urls_are_revalidated(app, client):
+    post_id = add_image_post(app, FIRST)
+    thumb = b"RIFF thumb"
+    with app.app_context():
+        source_hash, (digest, byte_size) = put_blob(FIRST)[0], put_blob(thumb)
+
+        def write(db):
+            mark_pending(db, source_hash, ["thumb"])
+            record_derivative(db, source_hash, "thumb", digest, byte_size, 32, 24)
+
+        run_write(write)
+
+    # v names the original, and a forced re-render can change the bytes under it
+    response = client.get(feed_image_url(client) + "&size=thumb")
+    assert response.data == thumb
+    assert response.cache_control.no_cache
+    assert not response.cache_control.immutable
+    assert client.get(feed_image_url(client) + "&size=thumb", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
@@ -0,0 +1,79 @@
+from app.cache.lru import LRUCache
+from app.metrics.multiprocess import collect_snapshots, mark_process_dead, merge_snapshots, start_worker, write_snapshot
+from app.metrics.registry import REGISTRY, Counter, Gauge, Histogram, Registry, render_snapshot
+
+def worker_registry(requests, in_flight, latencies):
+    """A registry standing in for one worker's, with its metrics already recorded"""
+    registry = Registry()
+    counter = Counter("requests_total", "Requests", ["status"], registry=registry)
+    gauge = Gauge("in_flight", "In flight", registry=registry)
+    histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1), registry=registry)
+    counter.labels("200").inc(requests)
+    gauge.set(in_flight)
+    for latency in latencies:
+        histogram.observe(latency)
+    return registry
+
+def test_workers_are_summed(tmp_path):
+    write_snapshot(tmp_path, worker_registry(3, 1, [0.05]), pid=101)
+    write_snapshot(tmp_path, worker_registry(4, 2, [0.5, 5]), pid=102)
+
+    text = render_snapshot(merge_snapshots(collect_snapshots(tmp_path)))
+
+    assert 'requests_total{status="200"} 7' in text
+    assert "in_flight 3" in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "latency_seconds_sum 5.55" in text
+    assert "latency_seconds_count 3" in text
+
+def test_exited_worker_keeps_counters_but_not_gauges(tmp_path):
+    write_snapshot(tmp_path, worker_registry(3, 1, [0.05]), pid=101)
+    write_snapshot(tmp_path, worker_registry(4, 2, [0.5]), pid=102)
+    mark_process_dead(tmp_path, 101)
+    # a replacement worker reuses nothing, and a second exit adds to dead.json
+    write_snapshot(tmp_path, worker_registry(5, 4, []), pid=103)
+    mark_process_dead(tmp_path, 102)
+
+    assert not (tmp_path / "101.json").exists()
+    text = render_snapshot(merge_snapshots(collect_snapshots(tmp_path)))
+    assert 'requests_total{status="200"} 12' in text
+    assert "in_flight 4" in text
+    assert "latency_seconds_count 2" in text
+
+def sample(client, series):
+    for line in client.get("/api/metrics").get_data(as_text=True).splitlines():
+        if line.startswith(series + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+def test_scrape_sums_other_workers(make_app, tmp_path):
+    directory = tmp_path / "metrics"
+    directory.mkdir()
+    # no flusher thread (gunicorn's post_fork starts it); the scrape writes this process's snapshot itself
+    app = make_app(METRICS_DIR=str(directory))
+    client = app.test_client()
+    client.get("/api/posts")
+    # the registry is process-wide, so earlier tests' requests are counted too
+    own = sample(client, 'http_responses_total{method="GET",endpoint="/api/posts",status="200"}')
+    assert own >= 1
+
+    # another worker that has answered the same requests
+    write_snapshot(directory, pid=1)
+    assert sample(client, 'http_responses_total{method="GET",endpoint="/api/posts",status="200"}') == 2 * own
+
+def test_without_directory_serves_own_metrics(app):
+    response = app.test_client().get("/api/metrics")
+    assert response.status_code == 200
+    assert "http_requests_in_flight" in response.get_data(as_text=True)
+
+def test_worker_keeps_counting_into_children_created_before_the_fork(tmp_path):
+    # like the token and feed caches, built in the gunicorn master before workers fork
+    cache = LRUCache(4, name="prefork_test")
+    cache.get("warm-up")
+    start_worker(tmp_path, interval=3600)
+
+    assert 'cache_requests_total{cache="prefork_test",result="miss"} 0' in REGISTRY.render()
+    cache.get("first request")
+    assert 'cache_requests_total{cache="prefork_test",result="miss"} 1' in REGISTRY.render()
@@ -0,0 +1,95 @@
+import re
+import sqlite3
+from functools import partial
+import pytest
+from flask import g
+from app.db.db import close_pools, get_db
+from app.models import changes, comment, derivative, event, post, search, user
+from app.storage.blobs import get_store_root, put_blob
+
+JPEG = b"\xff\xd8\xff\xe0"
+
+# each model query, run for real, with the indexes its plan must use
+MODEL_QUERIES = [
+    ("posts page", lambda ids: post.get_posts_page(21), ["SCAN i USING INDEX idx_images_feed"]),
+    ("posts page after a cursor", lambda ids: post.get_posts_page(21, before=(2 ** 40, 10 ** 9), fields=("username",)),
+     ["SEARCH i USING INDEX idx_images_feed"]),
+    ("posts by ids", lambda ids: post.get_posts_by_ids(ids["posts"]), ["SEARCH i USING INTEGER PRIMARY KEY"]),
+    ("post meta", lambda ids: post.get_post_meta(ids["posts"][0]), ["SEARCH images USING INTEGER PRIMARY KEY"]),
+    ("image meta", lambda ids: post.get_image_meta(ids["posts"][0]), ["SEARCH images USING INTEGER PRIMARY KEY"]),
+    ("comments of a post", lambda ids: comment.get_comments_for_post(ids["posts"][0]),
+     ["SEARCH c USING INDEX idx_comments_image (image_id=?)"]),
+    ("comments page", lambda ids: comment.get_comments_for_post(ids["posts"][0], limit=5, after=(0, 0)),
+     ["SEARCH c USING INDEX idx_comments_image (image_id=? AND created_at>?)"]),
+    ("first comments of posts", lambda ids: comment.get_comments_for_posts(ids["posts"], 3),
+     ["SEARCH images USING INTEGER PRIMARY KEY", "SEARCH c USING INDEX idx_comments_image (image_id=?)"]),
+    ("changes", lambda ids: changes.get_changes(0, 2, ("description", "username")),
+     ["SEARCH images USING COVERING INDEX idx_images_change", "SEARCH comments USING COVERING INDEX idx_comments_change",
+      "SEARCH deleted_posts USING COVERING INDEX idx_deleted_posts_change", "SEARCH i USING INDEX idx_images_change",
+      "SEARCH c USING INDEX idx_comments_change"]),
+    ("events after an id", lambda ids: event.get_events_after(get_db(), 0, 10), ["SEARCH post_events USING INTEGER PRIMARY KEY"]),
+    ("event bounds", lambda ids: event.get_event_bounds(get_db()), ["SEARCH post_events"]),
+    ("derivative", lambda ids: derivative.get_derivative("0" * 64, "thumb"),
+     ["SEARCH image_derivatives USING INDEX sqlite_autoindex_image_derivatives_1"]),
+    ("images needing derivatives", lambda ids: derivative.get_images_needing_derivatives(["thumb", "medium"], "", 10),
+     ["SEARCH i USING COVERING INDEX idx_images_hash"]),
+    ("user by id", lambda ids: user.get_user_by_id(ids["user"]), ["SEARCH users USING INTEGER PRIMARY KEY"]),
+    # a known user missing from this process's cache, as after a worker restart
+    ("known user by sub", lambda ids: (user.get_user_id_cache().clear(), user.get_or_create_user("auth0|planner")),
+     ["SEARCH users USING COVERING INDEX"]),
+    ("rename user", lambda ids: user.update_username(ids["user"], "renamed"),
+     ["SEARCH users USING COVERING INDEX sqlite_autoindex_users_1", "SEARCH images USING INDEX idx_images_user",
+      "SEARCH comments USING INDEX idx_comments_user"]),
+    ("comment on a post", lambda ids: comment.create_comment(ids["posts"][0], ids["user"], "one more"),
+     ["SEARCH images USING INTEGER PRIMARY KEY"]),
+    ("delete a post", lambda ids: post.delete_post(ids["posts"][-1], ids["user"]),
+     ["SEARCH images USING INTEGER PRIMARY KEY", "SEARCH images USING COVERING INDEX idx_images_hash"]),
+    ("search", lambda ids: search.search_posts(search.build_match_terms("hello wor"), 10),
+     ["SCAN post_search VIRTUAL TABLE INDEX", "SCAN comment_search VIRTUAL TABLE INDEX"]),
+]
+
+# ranking needs every match sorted by score
+SORTS_ALLOWED = {"search"}
+
+@pytest.fixture
+def ids(app):
+    with app.app_context():
+        g.user_claims = {"sub": "auth0|planner"}
+        user_id = user.get_or_create_user("auth0|planner")
+        for i in range(3):
+            post.add_post(user_id, "image.jpg", f"hello world {i}", partial(put_blob, JPEG + bytes([i]), get_store_root()), "image/jpeg")
+        post_ids = [row[0] for row in get_db().execute("SELECT id FROM images ORDER BY id")]
+        comment.create_comments(user_id, [(post_id, "a comment") for post_id in post_ids])
+    # reconnect, so the statements fixture sees every connection
+    close_pools()
+    return {"user": user_id, "posts": post_ids}
+
+def plans(app, executed):
+    """(statement, plan lines) for each statement run, with bound values inlined by the trace"""
+    conn = sqlite3.connect(app.config["DATABASE_PATH"])
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    try:
+        for sql in executed:
+            if re.match(r"\s*(PRAGMA|BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|--)", sql, re.IGNORECASE):
+                continue
+            yield sql, [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)], tables
+    finally:
+        conn.close()
+
+@pytest.mark.parametrize("name, run, expected", MODEL_QUERIES, ids=[name for name, _, _ in MODEL_QUERIES])
+def test_model_query_plan(app, ids, statements, name, run, expected):
+    with app.app_context():
+        g.user_claims = {"sub": "auth0|planner"}
+        run(ids)
+
+    lines = []
+    for sql, plan, tables in plans(app, statements):
+        for line in plan:
+            scanned = re.fullmatch(r"SCAN (\w+)", line)
+            assert not (scanned and scanned.group(1) in tables), f"full scan in {sql!r}: {plan}"
+            if name not in SORTS_ALLOWED:
+                assert "TEMP B-TREE" not in line, f"sort in {sql!r}: {plan}"
+        lines.extend(plan)
+
+    for index in expected:
+        assert any(line.startswith(index) for line in lines), f"{index!r} not in {lines}"
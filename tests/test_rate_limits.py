@@ -0,0 +1,34 @@
+# a budget of two requests that doesn't refill during the test
+LIMITS = dict(RATE_LIMIT_ENABLED=True, RATE_LIMIT_READ_BURST=2, RATE_LIMIT_READ_PER_SEC=0.001,
+              RATE_LIMIT_WRITE_BURST=2, RATE_LIMIT_WRITE_PER_SEC=0.001)
+
+def feed_statuses(client, *forwarded_for):
+    return [client.get("/api/posts", headers={"X-Forwarded-For": address}).status_code for address in forwarded_for]
+
+def test_clients_behind_a_trusted_proxy_get_their_own_budget(make_app):
+    client = make_app(PROXY_FIX_X_FOR=1, **LIMITS).test_client()
+    assert feed_statuses(client, "203.0.113.1", "203.0.113.1", "203.0.113.1") == [200, 200, 429]
+    assert feed_statuses(client, "203.0.113.2") == [200]
+
+def test_forwarded_for_is_ignored_without_a_trusted_proxy(make_app):
+    client = make_app(PROXY_FIX_X_FOR=0, **LIMITS).test_client()
+    assert feed_statuses(client, "203.0.113.1", "203.0.113.2", "203.0.113.3") == [200, 200, 429]
+
+def test_failed_token_verifications_use_the_ip_budget(make_app):
+    client = make_app(**LIMITS).test_client()
+    bad = {"Authorization": "Bearer not-a-token"}
+    statuses = [client.post("/api/comments", json={"post_id": 1, "text": "hi"}, headers=bad).status_code for _ in range(3)]
+    assert statuses == [401, 401, 429]
+
+def test_only_tokens_that_need_verifying_use_the_ip_budget(make_app, auth_headers):
+    client = make_app(**dict(LIMITS, RATE_LIMIT_WRITE_BURST=3)).test_client()
+    headers = {sub: auth_headers(sub) for sub in ("auth0|a", "auth0|b", "auth0|c", "auth0|d")}
+
+    def comment(sub):
+        return client.post("/api/comments", json={"post_id": 1, "text": "hi"}, headers=headers[sub]).status_code
+
+    # one verification, then cached: the IP budget is charged once, the user's three times
+    assert [comment("auth0|a") for _ in range(3)] == [404, 404, 404]
+    assert comment("auth0|a") == 429
+    # two more first-time tokens use up the IP budget
+    assert [comment("auth0|b"), comment("auth0|c"), comment("auth0|d")] == [404, 404, 429]
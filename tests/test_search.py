@@ -0,0 +1,94 @@
+import sqlite3
+from functools import partial
+from flask import g
+from app.db import migrations
+from app.db.db import get_db, run_write
+from app.models.comment import create_comment
+from app.models.post import add_post, delete_post, update_post_description
+from app.models.user import get_or_create_user
+from app.storage.blobs import get_store_root, put_blob
+
+JPEG = b"\xff\xd8\xff\xe0" + b"jpeg body"
+
+def add_post_as(sub, description):
+    g.user_claims = {"sub": sub}
+    user_id = get_or_create_user(sub)
+    add_post(user_id, "image.jpg", description, partial(put_blob, JPEG, get_store_root()), "image/jpeg")
+    return user_id, get_db().execute("SELECT max(id) FROM images").fetchone()[0]
+
+def search_ids(client, q):
+    response = client.get("/api/search", query_string={"q": q})
+    assert response.status_code == 200
+    return [result["id"] for result in response.get_json()["results"]]
+
+def test_every_term_must_match_somewhere_in_the_post(app, client):
+    with app.app_context():
+        user_id, sunset = add_post_as("auth0|a", "sunset over the lake")
+        _, other = add_post_as("auth0|b", "sunset in the city")
+        create_comment(sunset, user_id, "lovely kayak")
+
+    assert sorted(search_ids(client, "sunset")) == sorted([sunset, other])
+    # one word from the description, one from a comment
+    assert search_ids(client, "sunset kayak") == [sunset]
+    assert search_ids(client, "sunset kay") == [sunset]
+    assert search_ids(client, "city kayak") == []
+
+def test_snippet_comes_from_the_best_matching_text(app, client):
+    with app.app_context():
+        user_id, post_id = add_post_as("auth0|a", "morning coffee")
+        create_comment(post_id, user_id, "that bicycle looks fast")
+
+    results = client.get("/api/search?q=bicycle").get_json()["results"]
+    assert results[0]["snippet"] == "that [bicycle] looks fast"
+    results = client.get("/api/search?q=coffee").get_json()["results"]
+    assert results[0]["snippet"] == "morning [coffee]"
+
+def test_index_follows_edits_and_deletes(app, client):
+    with app.app_context():
+        user_id, post_id = add_post_as("auth0|a", "old words")
+        create_comment(post_id, user_id, "gone soon")
+        update_post_description(post_id, "new words")
+
+    assert search_ids(client, "old") == []
+    assert search_ids(client, "new") == [post_id]
+
+    with app.app_context():
+        delete_post(post_id, user_id)
+        counts = get_db().execute(
+            "SELECT (SELECT count(*) FROM post_search), (SELECT count(*) FROM comment_search)"
+        ).fetchone()
+    assert tuple(counts) == (0, 0)
+
+def test_comment_insert_work_does_not_grow_with_the_thread(app):
+    with app.app_context():
+        user_id, quiet = add_post_as("auth0|a", "quiet thread")
+        _, busy = add_post_as("auth0|a", "busy thread")
+        for i in range(50):
+            create_comment(busy, user_id, f"comment number {i}")
+
+        # rows written by one comment insert, including the FTS shadow tables
+        def rows_written(post_id):
+            def write(db):
+                before = db.total_changes
+                db.execute("INSERT INTO comments (image_id, user_id, comment_text, created_at) VALUES (?, ?, 'one more', 0)", (post_id, user_id))
+                return db.total_changes - before
+            return run_write(write)
+
+        assert rows_written(busy) == rows_written(quiet)
+        assert get_db().execute("SELECT count(*) FROM comment_search WHERE post_id = ?", (busy,)).fetchone()[0] == 51
+
+def test_upgrade_indexes_existing_posts_and_comments(monkeypatch):
+    db = sqlite3.connect(":memory:", isolation_level=None)
+    db.row_factory = sqlite3.Row
+    # a database from before the search index
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS[:3])
+    monkeypatch.setattr(migrations, "LATEST_VERSION", 3)
+    migrations.migrate(db)
+    db.execute("INSERT INTO users (id, username, auth0_sub) VALUES (1, 'alice', 'auth0|alice')")
+    db.execute("INSERT INTO images (id, user_id, name, description, uploaded_at) VALUES (7, 1, 'a.jpg', 'sunset over the lake', 0)")
+    db.execute("INSERT INTO comments (id, image_id, user_id, comment_text, created_at) VALUES (3, 7, 1, 'lovely kayak', 0)")
+    monkeypatch.undo()
+
+    assert migrations.migrate(db) == migrations.LATEST_VERSION
+    assert [tuple(row) for row in db.execute("SELECT rowid FROM post_search WHERE post_search MATCH 'sunset alice'")] == [(7,)]
+    assert [tuple(row) for row in db.execute("SELECT rowid, post_id FROM comment_search WHERE comment_search MATCH 'kayak'")] == [(3, 7)]
@@ -0,0 +1,14 @@
+import os
+from bench.startup import profile_imports
+
+# create_app's imports under -X importtime (which inflates them) take about 500 ms
+# on a dev machine; the default leaves room for slower CI runners
+IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", 1000))
+
+def test_create_app_imports_stay_lean():
+    # best of three: a cold disk cache or a busy machine only ever adds time
+    runs = [profile_imports() for _ in range(3)]
+    import_ms, slowest, lazy_seen = min(runs, key=lambda run: run[0])
+
+    assert lazy_seen == [], f"imported at startup but meant to be lazy: {lazy_seen}"
+    assert import_ms < IMPORT_BUDGET_MS, f"imports took {import_ms:.1f} ms; slowest: {slowest}"
@@ -0,0 +1,57 @@
+from functools import partial
+from flask import g
+from app.db.db import get_db
+from app.models.post import add_post
+from app.models.user import get_or_create_user
+from app.storage.blobs import get_store_root, put_blob
+
+JPEG = b"\xff\xd8\xff\xe0" + b"jpeg body " * 10
+PNG = b"\x89PNG\r\n\x1a\n" + b"png body " * 10
+BOUNDARY = "test-boundary"
+
+def multipart(*parts):
+    """A multipart/form-data body from (name, filename or None, bytes) parts"""
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+def post_form(client, headers, *parts, method="POST", url="/api/posts"):
+    return client.open(url, method=method, data=multipart(*parts), headers=headers(),
+                       content_type=f"multipart/form-data; boundary={BOUNDARY}")
+
+def latest_post(app):
+    with app.app_context():
+        return get_db().execute("SELECT id, mime_type, image_size FROM images ORDER BY id DESC LIMIT 1").fetchone()
+
+def test_empty_file_input_before_the_image_keeps_the_image(app, client, auth_headers):
+    response = post_form(client, auth_headers,
+                         ("description", None, b"two inputs"),
+                         ("attachment", "", b""),
+                         ("image", "photo.jpg", JPEG))
+    assert response.status_code == 201
+
+    post = latest_post(app)
+    assert (post["mime_type"], post["image_size"]) == ("image/jpeg", len(JPEG))
+    assert client.get(f"/api/images/download/{post['id']}").data == JPEG
+
+def test_image_part_without_data_is_rejected(app, client, auth_headers):
+    response = post_form(client, auth_headers, ("description", None, b"no bytes"), ("image", "photo.jpg", b""))
+    assert response.status_code == 400
+    assert latest_post(app) is None
+
+def test_patch_with_empty_file_input_replaces_the_image(app, client, auth_headers):
+    with app.app_context():
+        g.user_claims = {"sub": "auth0|tester"}
+        add_post(get_or_create_user("auth0|tester"), "photo.jpg", "original", partial(put_blob, JPEG, get_store_root()), "image/jpeg")
+    post_id = latest_post(app)["id"]
+
+    response = post_form(client, auth_headers, ("attachment", "", b""), ("image", "new.png", PNG),
+                         method="PATCH", url=f"/api/posts/{post_id}")
+    assert response.status_code == 200
+
+    post = latest_post(app)
+    assert (post["mime_type"], post["image_size"]) == ("image/png", len(PNG))
@@ -0,0 +1,26 @@
+from flask import g
+from app.db.db import close_pools
+from app.models import user
+
+def test_known_user_is_read_without_a_write(app, statements):
+    with app.app_context():
+        g.user_claims = {"sub": "auth0|known"}
+        user_id = user.get_or_create_user("auth0|known")
+
+    # a cold cache, as in a new worker; reconnecting lets the statements fixture see every connection
+    close_pools()
+    statements.clear()
+    user.get_user_id_cache().clear()
+    with app.app_context():
+        assert user.get_or_create_user("auth0|known") == user_id
+        # found again in the cache afterwards
+        assert user.get_or_create_user("auth0|known") == user_id
+    assert [sql for sql in statements if not sql.startswith("PRAGMA")] == ["SELECT id FROM users WHERE auth0_sub = 'auth0|known'"]
+
+def test_new_user_is_created_once(app):
+    with app.app_context():
+        g.user_claims = {"sub": "auth0|new", "email": "new@example.com"}
+        user_id = user.get_or_create_user("auth0|new")
+        user.get_user_id_cache().clear()
+        assert user.get_or_create_user("auth0|new") == user_id
+        assert user.get_user_by_id(user_id)["username"] == "new@example.com"
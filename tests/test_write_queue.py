@@ -0,0 +1,52 @@
+import base64
+import hashlib
+import os
+import pytest
+from app.db.db import get_db
+
+# the model write paths run on the group-commit writer thread, outside any app context
+JPEG = b"\xff\xd8\xff\xe0" + b"json upload"
+PNG = b"\x89PNG\r\n\x1a\n" + b"raw upload " * 10
+NEW_JPEG = b"\xff\xd8\xff\xe0" + b"json replacement"
+NEW_PNG = b"\x89PNG\r\n\x1a\n" + b"raw replacement " * 10
+
+@pytest.fixture
+def app(make_app):
+    return make_app(WRITE_QUEUE_ENABLED=True)
+
+def stored_blobs(app):
+    """Digests of the files in the blob store"""
+    return {name for _, _, names in os.walk(app.config["BLOB_STORE_PATH"]) for name in names}
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+def latest_post_id(app):
+    with app.app_context():
+        return get_db().execute("SELECT max(id) FROM images").fetchone()[0]
+
+def test_post_lifecycle_through_the_write_queue(app, client, auth_headers):
+    response = client.post("/api/posts", headers=auth_headers(), json={
+        "image": base64.b64encode(JPEG).decode(), "description": "from json", "mime_type": "image/jpeg"})
+    assert response.status_code == 201
+    json_post = latest_post_id(app)
+
+    response = client.post("/api/posts?description=from+upload", data=PNG, headers=auth_headers(), content_type="image/png")
+    assert response.status_code == 201
+    upload_post = latest_post_id(app)
+    assert stored_blobs(app) == {digest(JPEG), digest(PNG)}
+
+    response = client.patch(f"/api/posts/{json_post}", headers=auth_headers(), json={
+        "image": base64.b64encode(NEW_JPEG).decode(), "mime_type": "image/jpeg"})
+    assert response.status_code == 200
+    response = client.patch(f"/api/posts/{upload_post}", data=NEW_PNG, headers=auth_headers(), content_type="image/png")
+    assert response.status_code == 200
+    # replaced images nothing else uses are released
+    assert stored_blobs(app) == {digest(NEW_JPEG), digest(NEW_PNG)}
+    assert client.get(f"/api/images/download/{json_post}").data == NEW_JPEG
+    assert client.get(f"/api/images/download/{upload_post}").data == NEW_PNG
+
+    assert client.delete(f"/api/posts/{json_post}", headers=auth_headers()).status_code == 200
+    assert client.delete(f"/api/posts/{upload_post}", headers=auth_headers()).status_code == 200
+    assert stored_blobs(app) == set()
+    assert client.get(f"/api/images/download/{json_post}").status_code == 404
@@ -0,0 +1,5 @@
+# wsgi.py - production entry point, e.g. gunicorn -c gunicorn.conf.py
+import os
+from app import create_app
+
+app = create_app(os.getenv("FLASK_CONFIG", "production"))